@@ -0,0 +1,4 @@
+"""
+Benchmarks of the application, run as scripts, e.g.
+``python -m benchmarks.storefront``.
+"""
@@ -0,0 +1,390 @@
+"""
+Storefront load benchmark.
+
+Seeds a synthetic catalog, customers and order history (see ``ourapp.seed``)
+into a temporary SQLite database, then replays the main shopping flows in process through
+the Flask test client:
+
+    - browse (anonymous): the homepage, a category page and a product page;
+    - buy (logged in): add products to the cart, view the cart, pay and
+      place the order;
+    - history (logged in): the confirmed orders page.
+
+Every request is timed and its SQL statements are counted from the
+Server-Timing header added by ``ourapp.metrics``. The report gives, for each
+step, the p50/p95/p99 latency and the mean number of queries per request,
+and the overall throughput.
+
+Runs are reproducible: the data and the sequence of requests come from a
+random generator with a fixed seed. The dataset sizes can be changed with
+``--products``, ``--orders`` and so on; a baseline only compares with runs
+of the same sizes.
+
+Latencies depend on the machine, so each run also times a fixed
+calibration workload (Python and SQLite work, like a request). With
+``--baseline`` the baseline's p95 latencies are scaled by the ratio of the
+two calibration times, and the run fails when a step's p95 latency grew by
+more than ``--tolerance`` over the scaled baseline, or when it runs more
+queries per request than the baseline; ``--write-baseline`` records the run
+as the new baseline instead, e.g. one per machine.
+
+Usage:
+    python -m benchmarks.storefront --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import select
+
+from ourapp import create_app
+from ourapp.extensions import db
+from ourapp.models import Category, Customer, Product
+from ourapp.seed import seed
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Rows seeded by default; every customer starts with a non-empty cart, so
+# the cart and checkout steps see more than the lines the flows add
+DATASET = {
+    "categories": 15,
+    "products": 2000,
+    "customers": 200,
+    "orders": 2000,
+    "carts": 200,
+}
+
+# Extra queries per request tolerated before a step counts as regressed;
+# cache expiry can move a step's mean slightly between runs
+QUERY_SLACK = 0.5
+# Growth of a step's p95 latency, in ms, too small to count as a regression
+# whatever the tolerance, as timer noise dominates sub-millisecond steps
+LATENCY_SLACK_MS = 0.5
+# Rounds of the calibration workload; the fastest one is kept
+CALIBRATION_ROUNDS = 5
+
+PAYMENT_FORM = {
+    "card_no": "4111111111111111",
+    "name": "Benchmark",
+    "expiry_date": "12" + str(datetime.now().year + 5),
+    "cvv": "123",
+}
+
+_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+def seed_dataset(random_seed, **dataset):
+    """
+    Fill the empty benchmark database with ``ourapp.seed`` data.
+
+    Args:
+        random_seed (int): Seed of the data generator.
+        dataset: Row counts passed on to ``ourapp.seed.seed``.
+
+    Returns:
+        dict: The seeded "categories" names, "product_ids" and "customer_ids".
+    """
+    seed(**{**DATASET, **dataset}, random_seed=random_seed)
+    return {
+        "categories": db.session.execute(select(Category.name).order_by(Category.id))
+        .scalars()
+        .all(),
+        "product_ids": db.session.execute(select(Product.id).order_by(Product.id))
+        .scalars()
+        .all(),
+        "customer_ids": db.session.execute(select(Customer.id).order_by(Customer.id))
+        .scalars()
+        .all(),
+    }
+
+
+def calibrate(rounds=CALIBRATION_ROUNDS):
+    """
+    Time a fixed workload of Python and SQLite work on this machine.
+
+    Returns:
+        float: Milliseconds taken by the fastest round.
+    """
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        connection = sqlite3.connect(":memory:")
+        connection.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT, price REAL)")
+        connection.executemany(
+            "INSERT INTO item VALUES (?, ?, ?)",
+            ((number, f"item {number}", number * 1.5) for number in range(5000)),
+        )
+        for number in range(0, 5000, 5):
+            row = connection.execute(
+                "SELECT name, price FROM item WHERE id = ?", (number,)
+            ).fetchone()
+            json.dumps({"name": row[0], "price": row[1]})
+        connection.close()
+        timings.append(time.perf_counter() - started)
+    return round(min(timings) * 1000, 3)
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Recorder:
+    """
+    Times test client requests and collects their query counts by step.
+    """
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.recording = True
+
+    def request(self, client, step, path, method="GET", **kwargs):
+        """
+        Send a request and record its latency and query count under ``step``.
+
+        Raises:
+            RuntimeError: The request did not succeed or redirect.
+        """
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f"{step}: {method} {path} returned {response.status_code}")
+        if self.recording:
+            match = _QUERIES.search(response.headers.get("Server-Timing", ""))
+            self.latencies[step].append(elapsed)
+            self.queries[step].append(int(match.group(1)) if match else 0)
+        return response
+
+    def summary(self, seconds):
+        """
+        Summarize the recorded requests.
+
+        Args:
+            seconds (float): Wall time of the recorded run.
+
+        Returns:
+            dict: Request count, throughput and per-step statistics.
+        """
+        requests = sum(len(values) for values in self.latencies.values())
+        steps = {}
+        for step, values in self.latencies.items():
+            steps[step] = {
+                "requests": len(values),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "queries": round(sum(self.queries[step]) / len(values), 2),
+            }
+        return {
+            "requests": requests,
+            "seconds": round(seconds, 3),
+            "throughput": round(requests / seconds, 1) if seconds else 0.0,
+            "steps": steps,
+        }
+
+
+def _login(client, customer_id):
+    with client.session_transaction() as session:
+        session["_user_id"] = str(customer_id)
+
+
+def run_flows(app, data, rng, recorder, iterations):
+    """
+    Replay ``iterations`` rounds of the browse, buy and history flows.
+    """
+    visitor = app.test_client()
+    shopper = app.test_client()
+    for _ in range(iterations):
+        category = rng.choice(data["categories"])
+        product_id = rng.choice(data["product_ids"])
+        recorder.request(visitor, "home", "/")
+        recorder.request(visitor, "category", f"/product/category/{category}")
+        recorder.request(visitor, "product", f"/product/{product_id}")
+
+        _login(shopper, rng.choice(data["customer_ids"]))
+        for cart_product in rng.sample(data["product_ids"], rng.randint(1, 3)):
+            recorder.request(shopper, "add_to_cart", f"/cart/add-to-cart/{cart_product}")
+        recorder.request(shopper, "cart", "/cart/")
+        recorder.request(shopper, "payment", "/payment/", method="POST", data=PAYMENT_FORM)
+        recorder.request(shopper, "place_order", "/order/place")
+        recorder.request(shopper, "order_history", "/order/confirmed")
+
+
+def benchmark(iterations=200, warmup=20, seed_value=1, dataset=None):
+    """
+    Seed a temporary database and time the storefront flows against it.
+
+    Args:
+        iterations (int): Recorded rounds of the flows.
+        warmup (int): Rounds run first, unrecorded, to fill the caches.
+        seed_value (int): Seed of the data and request generator.
+        dataset (dict): Row counts overriding DATASET.
+
+    Returns:
+        dict: The run summary, see ``Recorder.summary``, with the
+        "calibration_ms" of this machine and the "dataset" sizes.
+    """
+    dataset = {**DATASET, **(dataset or {})}
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app(
+            {
+                "SQLALCHEMY_DATABASE_URI": "sqlite:///"
+                + os.path.join(directory, "benchmark.db"),
+                "LOG_FILE": os.path.join(directory, "benchmark.log"),
+                "LOG_TO_STDERR": False,
+                "METRICS_RESPONSE_HEADER": True,
+                "WTF_CSRF_ENABLED": False,
+            }
+        )
+        rng = random.Random(seed_value)
+        with app.app_context():
+            data = seed_dataset(seed_value, **dataset)
+            db.session.remove()
+
+        recorder = Recorder()
+        recorder.recording = False
+        run_flows(app, data, rng, recorder, warmup)
+        recorder.recording = True
+        started = time.perf_counter()
+        run_flows(app, data, rng, recorder, iterations)
+        summary = recorder.summary(time.perf_counter() - started)
+
+        with app.app_context():
+            db.engine.dispose()
+    summary["calibration_ms"] = calibrate()
+    summary["dataset"] = dataset
+    return summary
+
+
+def regressions(summary, baseline, tolerance):
+    """
+    Compare a run with a baseline.
+
+    When both have a calibration time, the baseline latencies are scaled by
+    the ratio of the run's calibration time to the baseline's, so a slower
+    machine is not reported as a regression.
+
+    Args:
+        summary (dict): The run summary.
+        baseline (dict): A summary recorded earlier.
+        tolerance (float): Allowed relative growth of a step's p95 latency.
+
+    Returns:
+        list: One message per regressed step, or a single message if the
+        dataset sizes differ; empty if there is none.
+    """
+    if "dataset" in baseline and baseline["dataset"] != summary.get("dataset"):
+        return [
+            f"dataset {summary.get('dataset')} differs from "
+            f"the baseline's {baseline['dataset']}"
+        ]
+    scale = 1.0
+    if summary.get("calibration_ms") and baseline.get("calibration_ms"):
+        scale = summary["calibration_ms"] / baseline["calibration_ms"]
+    problems = []
+    for step, expected in baseline.get("steps", {}).items():
+        actual = summary["steps"].get(step)
+        if actual is None:
+            problems.append(f"{step}: step missing from the run")
+            continue
+        expected_p95 = expected["p95_ms"] * scale
+        if actual["p95_ms"] > expected_p95 * (1 + tolerance) + LATENCY_SLACK_MS:
+            problems.append(
+                f"{step}: p95 {actual['p95_ms']} ms, "
+                f"baseline {round(expected_p95, 2)} ms on this machine"
+            )
+        if actual["queries"] > expected["queries"] + QUERY_SLACK:
+            problems.append(
+                f"{step}: {actual['queries']} queries per request, "
+                f"baseline {expected['queries']}"
+            )
+    return problems
+
+
+def format_report(summary):
+    """
+    Render a run summary as a text table.
+    """
+    lines = [
+        f"{'step':<14}{'requests':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}"
+    ]
+    for step, stats in summary["steps"].items():
+        lines.append(
+            f"{step:<14}{stats['requests']:>9}{stats['p50_ms']:>9}"
+            f"{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['queries']:>9}"
+        )
+    lines.append(
+        f"{summary['requests']} requests in {summary['seconds']} s, "
+        f"{summary['throughput']} requests/s"
+    )
+    if "calibration_ms" in summary:
+        lines.append(f"calibration {summary['calibration_ms']} ms")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """
+    Run the benchmark from the command line.
+
+    Returns:
+        int: The exit status, 1 if the run regressed against the baseline.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the storefront flows.")
+    parser.add_argument("--iterations", type=int, default=200,
+                        help="Recorded rounds of the flows (default: 200).")
+    parser.add_argument("--warmup", type=int, default=20,
+                        help="Unrecorded rounds run first (default: 20).")
+    parser.add_argument("--seed", type=int, default=1,
+                        help="Seed of the data and request generator (default: 1).")
+    parser.add_argument("--baseline", default=None,
+                        help="Baseline file the run is compared with.")
+    parser.add_argument("--write-baseline", action="store_true",
+                        help="Record the run as the baseline instead of comparing.")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed relative growth of p95 latency (default: 0.5).")
+    for table, count in DATASET.items():
+        parser.add_argument(f"--{table}", type=int, default=count,
+                            help=f"Seeded {table} (default: {count}).")
+    args = parser.parse_args(argv)
+
+    summary = benchmark(
+        iterations=args.iterations,
+        warmup=args.warmup,
+        seed_value=args.seed,
+        dataset={table: getattr(args, table) for table in DATASET},
+    )
+    print(format_report(summary))
+
+    baseline_path = args.baseline or DEFAULT_BASELINE
+    if args.write_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as baseline_file:
+            json.dump(summary, baseline_file, indent=2)
+            baseline_file.write("\n")
+        print(f"Baseline written to {baseline_path}")
+        return 0
+    if args.baseline:
+        with open(baseline_path, encoding="utf-8") as baseline_file:
+            problems = regressions(summary, json.load(baseline_file), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Store order totals and item summaries on the order
+
+Revision ID: 7d2e9b4c1a53
+Revises: 3c1f5a7e2b90
+Create Date: 2026-10-18 11:40:05.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2e9b4c1a53'
+down_revision = '3c1f5a7e2b90'
+branch_labels = None
+depends_on = None
+
+# Number of orders backfilled per statement batch
+BATCH_SIZE = 1000
+
+order_table = sa.table(
+    'order',
+    sa.column('id', sa.Integer),
+    sa.column('total_amount', sa.Float),
+    sa.column('item_count', sa.Integer),
+    sa.column('item_summary', sa.Text),
+)
+ordered_item_table = sa.table(
+    'ordered_item',
+    sa.column('order_id', sa.Integer),
+    sa.column('product_id', sa.Integer),
+    sa.column('quantity', sa.Integer),
+    sa.column('price', sa.Float),
+)
+product_table = sa.table(
+    'product',
+    sa.column('id', sa.Integer),
+    sa.column('name', sa.String),
+)
+
+
+def backfill(connection):
+    """
+    Compute the stored totals of existing orders, one batch of order ids at a time.
+    """
+    last_id = None
+    while True:
+        query = sa.select(order_table.c.id).order_by(order_table.c.id).limit(BATCH_SIZE)
+        if last_id is not None:
+            query = query.where(order_table.c.id > last_id)
+        order_ids = connection.execute(query).scalars().all()
+        if not order_ids:
+            break
+        last_id = order_ids[-1]
+
+        summaries = {
+            order_id: {'total_amount': 0, 'item_count': 0, 'names': []}
+            for order_id in order_ids
+        }
+        items = connection.execute(
+            sa.select(
+                ordered_item_table.c.order_id,
+                ordered_item_table.c.quantity,
+                ordered_item_table.c.price,
+                product_table.c.name,
+            )
+            .join(product_table, product_table.c.id == ordered_item_table.c.product_id)
+            .where(ordered_item_table.c.order_id.in_(order_ids))
+        )
+        for order_id, quantity, price, name in items:
+            summary = summaries[order_id]
+            summary['total_amount'] += price * quantity
+            summary['item_count'] += quantity
+            if name not in summary['names']:
+                summary['names'].append(name)
+
+        connection.execute(
+            order_table.update()
+            .where(order_table.c.id == sa.bindparam('order_id'))
+            .values(
+                total_amount=sa.bindparam('total_amount'),
+                item_count=sa.bindparam('item_count'),
+                item_summary=sa.bindparam('item_summary'),
+            ),
+            [
+                {
+                    'order_id': order_id,
+                    'total_amount': summary['total_amount'],
+                    'item_count': summary['item_count'],
+                    'item_summary': '\n'.join(summary['names']),
+                }
+                for order_id, summary in summaries.items()
+            ],
+        )
+
+
+def upgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_amount', sa.Float(precision=100), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('item_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('item_summary', sa.Text(), nullable=False, server_default=''))
+
+    backfill(op.get_bind())
+
+
+def downgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_column('item_summary')
+        batch_op.drop_column('item_count')
+        batch_op.drop_column('total_amount')
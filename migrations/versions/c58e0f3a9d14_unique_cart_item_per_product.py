@@ -0,0 +1,47 @@
+"""Allow only one cart line per customer and product
+
+Revision ID: c58e0f3a9d14
+Revises: a41b8c6d0e27
+Create Date: 2026-10-18 13:02:18.660492
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c58e0f3a9d14'
+down_revision = 'a41b8c6d0e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Merge duplicate cart lines into the oldest one before adding the constraint
+    op.execute(
+        """
+        UPDATE cart_item SET quantity = (
+            SELECT SUM(duplicate.quantity) FROM cart_item AS duplicate
+            WHERE duplicate.customer_id = cart_item.customer_id
+            AND duplicate.product_id = cart_item.product_id
+        )
+        WHERE id IN (
+            SELECT MIN(id) FROM cart_item GROUP BY customer_id, product_id
+            HAVING COUNT(*) > 1
+        )
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM cart_item WHERE id NOT IN (
+            SELECT MIN(id) FROM cart_item GROUP BY customer_id, product_id
+        )
+        """
+    )
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_cart_item_customer_product', ['customer_id', 'product_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_cart_item_customer_product', type_='unique')
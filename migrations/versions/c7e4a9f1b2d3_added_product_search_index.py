@@ -0,0 +1,47 @@
+"""Added the product_search full-text index table
+
+Revision ID: c7e4a9f1b2d3
+Revises: 8b3d6e0f2a71
+Create Date: 2026-10-18 19:52:13.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e4a9f1b2d3'
+down_revision = '8b3d6e0f2a71'
+branch_labels = None
+depends_on = None
+
+
+def fts5_supported(connection):
+    if connection.dialect.name != 'sqlite':
+        return False
+    options = connection.exec_driver_sql('PRAGMA compile_options').scalars().all()
+    return 'ENABLE_FTS5' in options
+
+
+def upgrade():
+    # The FTS5 virtual table only exists on SQLite builds with FTS5; other
+    # databases use the LIKE search fallback
+    connection = op.get_bind()
+    # Earlier releases created the table at startup
+    if fts5_supported(connection) and not sa.inspect(connection).has_table('product_search'):
+        op.execute(
+            'CREATE VIRTUAL TABLE product_search '
+            'USING fts5(name, small_description, description, features)'
+        )
+        op.execute(
+            sa.text(
+                'INSERT INTO product_search '
+                '(rowid, name, small_description, description, features) '
+                'SELECT id, name, small_description, description, features FROM product'
+            )
+        )
+
+
+def downgrade():
+    if fts5_supported(op.get_bind()):
+        op.execute('DROP TABLE IF EXISTS product_search')
@@ -0,0 +1,58 @@
+"""Indexes for hot lookup paths and case-normalized category names
+
+Revision ID: e93a27d5b6f1
+Revises: c58e0f3a9d14
+Create Date: 2026-10-18 13:48:09.114270
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e93a27d5b6f1'
+down_revision = 'c58e0f3a9d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('name_normalized', sa.String(length=100), nullable=False, server_default=''))
+
+    op.execute("UPDATE category SET name_normalized = LOWER(TRIM(name))")
+
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_category_name_normalized'), ['name_normalized'], unique=False)
+
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_cart_item_product_id'), ['product_id'], unique=False)
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.create_index('ix_order_customer_status_date', ['customer_id', 'status', 'ordered_date'], unique=False)
+
+    with op.batch_alter_table('ordered_item', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_ordered_item_order_id'), ['order_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_ordered_item_product_id'), ['product_id'], unique=False)
+
+    with op.batch_alter_table('product_category', schema=None) as batch_op:
+        batch_op.create_index('ix_product_category_category_id', ['category_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product_category', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_category_category_id')
+
+    with op.batch_alter_table('ordered_item', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ordered_item_product_id'))
+        batch_op.drop_index(batch_op.f('ix_ordered_item_order_id'))
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_customer_status_date')
+
+    with op.batch_alter_table('cart_item', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_cart_item_product_id'))
+
+    with op.batch_alter_table('category', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_category_name_normalized'))
+        batch_op.drop_column('name_normalized')
@@ -9,19 +9,31 @@ from .admin import admin
 
 # from .models import Customer, Product, Category, Order, OrderedItem, CartItem
 from .auth import auth
+from .cache import init_cache
 from .cart import cart_bp
+from .category_index import init_category_index
+from .cli import register_commands
 from .extensions import init_db, init_login_manager
+from .logging_config.config import init_logging
+from .metrics import init_metrics
 from .order import order_bp
 from .payment import payment_bp
 from .product import product_bp
 from .public import public
+from .reports import reports_bp
+from .search import init_search
+from .suggest import init_suggest
 from .user import user_bp
 
 
-def create_app():
+def create_app(config=None):
     """
     Create and configure the Flask application.
 
+    Args:
+        config (dict): Settings that override the defaults, applied before
+        the extensions are initialized, e.g. another database URI.
+
     Returns:
         Flask: The configured Flask application instance.
     """
@@ -31,10 +43,22 @@ def create_app():
     app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///project.db"
     app.config["SECRET_KEY"] = "Super secret key"
     ######################################################
+    # FLASK_<KEY> environment variables override the defaults above, e.g.
+    # FLASK_SQLALCHEMY_DATABASE_URI or FLASK_DB_POOL_SIZE
+    app.config.from_prefixed_env()
+    if config:
+        app.config.update(config)
 
+    init_logging(app=app)
+    init_metrics(app=app)
     init_db(app=app)
     init_login_manager(app=app)
+    init_cache(app=app)
+    init_category_index(app=app)
+    init_search(app=app)
+    init_suggest(app=app)
     admin.init_app(app=app)
+    register_commands(app=app)
 
     @app.errorhandler(404)
     def not_found(e):
@@ -50,6 +74,7 @@ def create_app():
     app.register_blueprint(cart_bp)
     app.register_blueprint(order_bp)
     app.register_blueprint(payment_bp)
+    app.register_blueprint(reports_bp)
 
     # Add views for each model
     # I dont know how it works, but it works
@@ -3,9 +3,11 @@ Admin functionality
 """
 
 from flask_admin import Admin
+from flask_admin.menu import MenuLink
 from flask_admin.contrib.sqla import ModelView
 from flask_login import current_user, login_required
 
+from ourapp.auth import forget_user
 from ourapp.extensions import db
 from ourapp.models import Customer  # Import your SQLAlchemy models
 
@@ -21,6 +23,15 @@ class SeccureModelView(ModelView):
         '''
         return current_user.is_authenticated and current_user.is_admin()
 
+    def after_model_change(self, form, model, is_created):
+        if isinstance(model, Customer):
+            forget_user(model.id)
+
+    def after_model_delete(self, model):
+        if isinstance(model, Customer):
+            forget_user(model.id)
+
 
 admin = Admin()
 admin.add_view(SeccureModelView(Customer, db.session))
+admin.add_link(MenuLink(name="Reports", endpoint="reports.index"))
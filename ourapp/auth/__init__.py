@@ -4,11 +4,13 @@ This module handles the user authentication for our application.
 This module provides routes for user login, signup, and logout functionalities.
 """
 
-from random import randint
 from flask import Blueprint, redirect, render_template, request, url_for, flash
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, login_required, logout_user
+from sqlalchemy.orm import make_transient_to_detached
+from ourapp.cache import user_cache
 from ourapp.extensions import db, login_manager
+from ourapp.ids import customer_ids
 from ourapp.models import Customer
 from ourapp.logging_config.config import logger
 from .form import LoginForm, SignupForm
@@ -16,6 +18,9 @@ from .form import LoginForm, SignupForm
 
 auth = Blueprint("auth", __name__, template_folder="templates", url_prefix="/auth")
 
+# Customer columns left out of the user cache, which may be a shared server
+UNCACHED_COLUMNS = ("password",)
+
 
 @auth.route("/login", methods=["GET", "POST"])
 def login():
@@ -53,9 +58,9 @@ def login():
 
 def generate_customer_id():
     """
-    Generates random customer id
+    Generates a unique, random looking customer id
     """
-    return randint(10**6, (10**7) - 1)
+    return customer_ids.allocate()
 
 
 @auth.route("/signup", methods=["GET", "POST"])
@@ -83,10 +88,7 @@ def signup():
                     "Attempted signup with existing email: %s", 
                     email)
             else:
-                while True:
-                    customer_id = generate_customer_id()
-                    if not Customer.query.filter_by(id=customer_id).first():
-                        break
+                customer_id = generate_customer_id()
 
                 user = Customer(
                     id=customer_id,
@@ -127,9 +129,40 @@ login_manager.login_view = "auth.login"
 @login_manager.user_loader
 def load_user(user_id):
     """
-    Load the user object from the database.
-
-    This function is required by Flask-Login to load a user from the
-    database based on the user_id provided.
+    Load the user object, from the user cache when possible.
+
+    This function is required by Flask-Login to load a user based on the
+    user_id provided. A cached profile is attached to the session without a
+    query, so changes made to ``current_user`` are still saved on commit.
+    The password hash is never cached; it is loaded from the database if
+    it is read.
+
+    ``forget_user`` only drops the profile cached by the current process.
+    With the memory cache backend, other workers keep serving their copy,
+    e.g. from before a password change or an admin edit, for up to
+    USER_CACHE_TTL seconds, which is why the TTL is short.
+    """
+    columns = user_cache.get(str(user_id))
+    if columns is not None:
+        customer = Customer(**columns)
+        make_transient_to_detached(customer)
+        return db.session.merge(customer, load=False)
+
+    customer = db.session.get(Customer, int(user_id))
+    if customer is not None:
+        user_cache.set(
+            str(user_id),
+            {
+                column.key: getattr(customer, column.key)
+                for column in Customer.__table__.columns
+                if column.key not in UNCACHED_COLUMNS
+            },
+        )
+    return customer
+
+
+def forget_user(user_id):
+    """
+    Drop a customer's cached profile after it has been changed.
     """
-    return Customer.query.get(int(user_id))
+    user_cache.delete(str(user_id))
@@ -0,0 +1,291 @@
+"""
+Bulk product import and export, used by the ``flask`` CLI commands.
+
+Files are CSV (with a header row) or JSON Lines, and are streamed: imports
+read and insert one chunk of rows at a time, committing after each chunk,
+and exports stream query results with ``yield_per``, so memory use does not
+grow with the size of the file or table.
+
+A product row has the Product columns (``name``, ``price``, ``description``,
+``small_description``, ``image_url``, ``features``) and ``categories``: a
+list in JSON Lines, or names separated by "|" in CSV. Missing categories are
+created.
+"""
+
+import csv
+import json
+from itertools import islice
+
+from sqlalchemy import select
+
+from ourapp.extensions import db
+from ourapp.models import Category, Order, OrderedItem, Product, product_category
+from ourapp.search import index_products
+from ourapp.signals import notify_catalog_changed
+
+FORMATS = ("csv", "jsonl")
+PRODUCT_FIELDS = (
+    "name",
+    "price",
+    "description",
+    "small_description",
+    "image_url",
+    "features",
+)
+CATEGORY_SEPARATOR = "|"
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class InvalidRowError(ValueError):
+    """
+    Raised when a row of an import file is invalid.
+    """
+
+
+def guess_format(filename, default="csv"):
+    """
+    Pick the file format from a file name's extension.
+    """
+    for file_format in FORMATS:
+        if filename.lower().endswith("." + file_format):
+            return file_format
+    if filename.lower().endswith(".json"):
+        return "jsonl"
+    return default
+
+
+def read_rows(stream, file_format):
+    """
+    Stream the records of a CSV or JSON Lines file as dictionaries.
+
+    Raises:
+        InvalidRowError: A JSON Lines record is not valid JSON or not an object.
+    """
+    if file_format == "csv":
+        yield from csv.DictReader(stream)
+        return
+    row = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as error:
+            raise InvalidRowError(f"Row {row}: invalid JSON ({error.msg})") from error
+        if not isinstance(record, dict):
+            raise InvalidRowError(f"Row {row}: not a JSON object")
+        yield record
+
+
+def _product_row(record, line):
+    """
+    Validate an imported record and split it into product columns and categories.
+    """
+    missing = [field for field in PRODUCT_FIELDS if record.get(field) in (None, "")]
+    if missing:
+        raise InvalidRowError(f"Row {line}: missing {', '.join(missing)}")
+    try:
+        price = float(record["price"])
+    except (TypeError, ValueError) as error:
+        raise InvalidRowError(f"Row {line}: invalid price {record['price']!r}") from error
+    categories = record.get("categories") or []
+    if isinstance(categories, str):
+        categories = categories.split(CATEGORY_SEPARATOR)
+    row = {field: str(record[field]) for field in PRODUCT_FIELDS}
+    row["price"] = price
+    return row, [name.strip() for name in categories if name.strip()]
+
+
+def _category_ids(names, known):
+    """
+    Resolve category names to ids, creating missing categories.
+
+    Args:
+        names (set): Category names used by the chunk.
+        known (dict): Lowercased name to id, filled in across chunks.
+    """
+    wanted = {name.lower(): name for name in names if name.lower() not in known}
+    if wanted:
+        rows = db.session.execute(
+            select(Category.name_normalized, Category.id).where(
+                Category.name_normalized.in_(wanted)
+            )
+        )
+        known.update(rows.all())
+        missing = [
+            {"name": name, "name_normalized": key}
+            for key, name in wanted.items()
+            if key not in known
+        ]
+        if missing:
+            created = db.session.execute(
+                db.insert(Category).returning(
+                    Category.name_normalized, Category.id, sort_by_parameter_order=True
+                ),
+                missing,
+            )
+            known.update(created.all())
+    return known
+
+
+def import_products(stream, file_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Import products with their categories from a CSV or JSON Lines stream.
+
+    Each chunk is inserted with executemany statements and committed on its
+    own; if a row is invalid, the chunks before it stay imported. The catalog
+    caches are told about the imported products once, at the end.
+
+    Args:
+        stream: A text stream to read from.
+        file_format (str): "csv" or "jsonl".
+        chunk_size (int): Number of rows inserted per transaction.
+
+    Returns:
+        int: The number of imported products.
+
+    Raises:
+        InvalidRowError: A row is not a record, is missing a field or has an
+        invalid price.
+    """
+    records = enumerate(read_rows(stream, file_format), start=1)
+    known_categories = {}
+    imported = []
+    try:
+        _import_chunks(records, chunk_size, known_categories, imported)
+    finally:
+        if imported:
+            notify_catalog_changed(imported)
+    return len(imported)
+
+
+def _import_chunks(records, chunk_size, known_categories, imported):
+    """
+    Insert and commit the records chunk by chunk, adding the ids of the
+    committed products to ``imported``.
+    """
+    while True:
+        chunk = [_product_row(record, line) for line, record in islice(records, chunk_size)]
+        if not chunk:
+            break
+        _category_ids(
+            {name for _, names in chunk for name in names}, known_categories
+        )
+        product_ids = (
+            db.session.execute(
+                db.insert(Product).returning(Product.id, sort_by_parameter_order=True),
+                [row for row, _ in chunk],
+            )
+            .scalars()
+            .all()
+        )
+        memberships = {
+            (product_id, known_categories[name.lower()])
+            for product_id, (_, names) in zip(product_ids, chunk)
+            for name in names
+        }
+        if memberships:
+            db.session.execute(
+                product_category.insert(),
+                [
+                    {"product_id": product_id, "category_id": category_id}
+                    for product_id, category_id in memberships
+                ],
+            )
+        index_products(product_ids)
+        db.session.commit()
+        imported.extend(product_ids)
+
+
+def _write_rows(stream, file_format, fields, rows):
+    """
+    Write dictionaries to a CSV or JSON Lines stream.
+
+    Returns:
+        int: The number of rows written.
+    """
+    count = 0
+    if file_format == "csv":
+        writer = csv.DictWriter(stream, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, default=str) + "\n")
+            count += 1
+    return count
+
+
+def _stream(statement, chunk_size):
+    return db.session.execute(
+        statement.execution_options(yield_per=chunk_size)
+    ).mappings()
+
+
+def _products_with_categories(file_format, chunk_size):
+    """
+    Stream products with their category names.
+
+    Products and memberships are both read in product id order and merged,
+    so neither result is held in memory.
+    """
+    products = _stream(
+        select(Product.id, *[getattr(Product, field) for field in PRODUCT_FIELDS])
+        .order_by(Product.id),
+        chunk_size,
+    )
+    memberships = _stream(
+        select(product_category.c.product_id, Category.name)
+        .join(Category, Category.id == product_category.c.category_id)
+        .order_by(product_category.c.product_id, Category.name),
+        chunk_size,
+    )
+    membership = next(memberships, None)
+    for product in products:
+        names = []
+        while membership is not None and membership["product_id"] <= product["id"]:
+            if membership["product_id"] == product["id"]:
+                names.append(membership["name"])
+            membership = next(memberships, None)
+        row = dict(product)
+        row["categories"] = (
+            names if file_format == "jsonl" else CATEGORY_SEPARATOR.join(names)
+        )
+        yield row
+
+
+def export_products(stream, file_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Export every product with its categories, in the import file layout.
+
+    Returns:
+        int: The number of exported products.
+    """
+    return _write_rows(
+        stream,
+        file_format,
+        ("id",) + PRODUCT_FIELDS + ("categories",),
+        _products_with_categories(file_format, chunk_size),
+    )
+
+
+def export_table(model, stream, file_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Export every row of a model's table, in primary key order.
+
+    Returns:
+        int: The number of exported rows.
+    """
+    table = model.__table__
+    return _write_rows(
+        stream,
+        file_format,
+        [column.name for column in table.columns],
+        _stream(select(table).order_by(*table.primary_key.columns), chunk_size),
+    )
+
+
+EXPORTABLE_TABLES = {"orders": Order, "ordered-items": OrderedItem}
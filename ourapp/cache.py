@@ -0,0 +1,416 @@
+"""
+Application caches.
+
+A Cache is bound to a backend when the application is created:
+
+    - "memory": an in-process LRU with a per-entry TTL (the default).
+    - "redis": a local Redis-compatible server, shared between workers.
+      Requires the ``redis`` package.
+
+With the memory backend each worker process has its own caches, and
+deleting or updating an entry only reaches the process doing it. Another
+worker can serve its own copy until the entry's TTL expires, so a cached
+cart is only consistent within one process. Cached carts are used for
+display only; checkout reads the cart from the database.
+
+Configuration:
+    CACHE_BACKEND (str): "memory" or "redis".
+    CACHE_REDIS_URL (str): URL of the Redis server.
+    PAGE_CACHE_TTL (int): Seconds a cached page is served for.
+    PAGE_CACHE_SIZE (int): Maximum number of cached pages per process.
+    CART_CACHE_ENABLED (bool): Whether carts are cached between requests.
+    CART_CACHE_TTL (int): Seconds a cached cart is kept.
+    CART_CACHE_SIZE (int): Maximum number of cached carts per process.
+    USER_CACHE_TTL (int): Seconds a logged-in user's profile is cached. With
+    the memory backend this bounds how long other workers can serve a
+    profile from before a change, e.g. a password change.
+    USER_CACHE_SIZE (int): Maximum number of cached profiles per process.
+    FACET_CACHE_TTL (int): Seconds cached listing facet counts are served for.
+    PRODUCT_CACHE_TTL (int): Seconds a product detail page's data is kept.
+    PRODUCT_CACHE_SIZE (int): Maximum number of cached products per process.
+    INDEX_BACKGROUND_REFRESH (bool): Rebuild in-memory indexes (MemoryIndex)
+    in a background thread; off, they are rebuilt in the thread that
+    changed the catalog, e.g. for an in-memory SQLite database, whose single
+    connection cannot be shared with another thread.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import make_response, request, session
+from flask_login import current_user
+from sqlalchemy.exc import OperationalError
+
+from ourapp.extensions import db
+from ourapp.logging_config.config import logger
+from ourapp.signals import catalog_changed
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU cache whose entries expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached value, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a value, evicting the least recently used entry when full.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """
+        Remove a key from the cache.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Remove every entry.
+        """
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """
+    Cache stored in a Redis-compatible server under a key prefix.
+    """
+
+    def __init__(self, client, prefix, ttl=60):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key):
+        """
+        Return the cached value, or None if it is missing or expired.
+        """
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        return pickle.loads(value)
+
+    def set(self, key, value, ttl=None):
+        """
+        Store a value with an expiry.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl or None)
+
+    def delete(self, key):
+        """
+        Remove a key from the cache.
+        """
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        """
+        Remove every entry under this cache's prefix.
+        """
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class Cache:
+    """
+    A named cache whose backend is chosen from the application config.
+
+    Until ``init_app`` is called the cache is an in-process LRU. Hits and
+    misses are counted per process.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=60):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app, maxsize=None, ttl=None):
+        """
+        Bind the cache to the backend configured for ``app``.
+        """
+        maxsize = self.maxsize if maxsize is None else maxsize
+        ttl = self.ttl if ttl is None else ttl
+        if app.config.get("CACHE_BACKEND", "memory") == "redis":
+            # pylint: disable=import-outside-toplevel
+            import redis
+
+            client = redis.Redis.from_url(
+                app.config.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+            )
+            self.backend = RedisCache(client, prefix=f"whatever:{self.name}:", ttl=ttl)
+        else:
+            self.backend = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key):
+        """
+        Return the cached value for ``key`` or None.
+        """
+        value = self.backend.get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Store ``value`` under ``key``.
+        """
+        self.backend.set(key, value, ttl=ttl)
+
+    def delete(self, key):
+        """
+        Remove ``key`` from the cache.
+        """
+        self.backend.delete(key)
+
+    def clear(self):
+        """
+        Remove every entry from the cache.
+        """
+        self.backend.clear()
+
+    def stats(self):
+        """
+        Return the hit and miss counts of this cache.
+        """
+        with self._stats_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+class MemoryIndex:
+    """
+    An index built from the database and kept in process memory.
+
+    The index is built when the application starts, so lookups never query
+    the database. ``refresh`` rebuilds it in a background thread and swaps
+    the complete new index in; lookups keep using the previous one
+    meanwhile, and refreshes requested during a rebuild are folded into one
+    more rebuild. Only the process making a catalog change refreshes its
+    index; with a TTL, a lookup of an older index also starts a refresh, so
+    other processes catch up.
+
+    Args:
+        build: Function building the index from a database connection.
+        ttl (int): Seconds after which a lookup starts a refresh; 0 never.
+    """
+
+    def __init__(self, build, ttl=0):
+        self.build = build
+        self.ttl = ttl
+        self.background = True
+        self._app = None
+        self._lock = threading.Lock()
+        # Replaced as a whole on every rebuild, so readers never see a partial index
+        self._state = (None, 0.0)
+        self._thread = None
+        self._pending = False
+
+    def init_app(self, app, ttl=None):
+        """
+        Build the index for ``app``.
+        """
+        self.ttl = self.ttl if ttl is None else ttl
+        self.background = app.config.get("INDEX_BACKGROUND_REFRESH", True)
+        self._app = app
+        self._state = (None, 0.0)
+        with app.app_context():
+            try:
+                self._rebuild()
+            except OperationalError:
+                # The tables do not exist yet; the first lookup builds it
+                pass
+
+    def _rebuild(self):
+        built_at = time.monotonic()
+        with db.engine.connect() as connection:
+            value = self.build(connection)
+        self._state = (value, built_at)
+        return value
+
+    def get(self):
+        """
+        Return the current index.
+        """
+        value, built_at = self._state
+        if value is None:
+            with self._lock:
+                value = self._state[0]
+                if value is None:
+                    value = self._rebuild()
+        elif self.ttl and time.monotonic() - built_at >= self.ttl:
+            if not self.background:
+                return self._rebuild_in_app()
+            self._start_refresh(again=False)
+        return value
+
+    def refresh(self):
+        """
+        Rebuild the index, in the background unless INDEX_BACKGROUND_REFRESH
+        is off.
+        """
+        if self.background:
+            self._start_refresh(again=True)
+        else:
+            self._rebuild_in_app()
+
+    def _rebuild_in_app(self):
+        with self._app.app_context():
+            return self._rebuild()
+
+    def _start_refresh(self, again):
+        with self._lock:
+            if self._thread is not None:
+                # A rebuild is running; it may have read the data too early
+                self._pending = self._pending or again
+                return
+            self._pending = True
+            self._thread = threading.Thread(
+                target=self._refresh_loop, name="memory-index-refresh", daemon=True
+            )
+            self._thread.start()
+
+    def _refresh_loop(self):
+        with self._app.app_context():
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        self._thread = None
+                        return
+                    self._pending = False
+                try:
+                    self._rebuild()
+                except Exception:  # pylint: disable=broad-exception-caught
+                    logger.exception("Rebuilding an in-memory index failed")
+
+    def join(self, timeout=None):
+        """
+        Wait for a running background refresh to finish.
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+
+page_cache = Cache("page", maxsize=256, ttl=60)
+cart_cache = Cache("cart", maxsize=10000, ttl=300)
+# Short, as other workers' copies outlive forget_user until they expire
+user_cache = Cache("user", maxsize=10000, ttl=60)
+facet_cache = Cache("facet", maxsize=1024, ttl=600)
+product_cache = Cache("product", maxsize=10000, ttl=600)
+
+
+def cached_page(view):
+    """
+    Serve a view's rendered HTML from the page cache for anonymous visitors.
+
+    Pages are keyed by endpoint and full path (including query arguments).
+    Logged-in users, and visitors with pending flash messages, always get a
+    freshly rendered page since their HTML differs.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if (
+            request.method != "GET"
+            or current_user.is_authenticated
+            or session.get("_flashes")
+        ):
+            return view(*args, **kwargs)
+        key = f"{request.endpoint}:{request.full_path}"
+        body = page_cache.get(key)
+        if body is not None:
+            return make_response(body)
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough:
+            page_cache.set(key, response.get_data(as_text=True))
+        return response
+
+    return wrapper
+
+
+def _clear_pages(sender, **extra):  # pylint: disable=unused-argument
+    page_cache.clear()
+
+
+def _clear_facets(sender, **extra):  # pylint: disable=unused-argument
+    facet_cache.clear()
+
+
+def _clear_products(sender, **extra):  # pylint: disable=unused-argument
+    # Cached details also hold the names and prices of related products
+    product_cache.clear()
+
+
+def _clear_carts(sender, product_ids, **extra):  # pylint: disable=unused-argument
+    # Cached carts hold product names and prices
+    if product_ids:
+        cart_cache.clear()
+
+
+def init_cache(app):
+    """
+    Bind the application caches to the configured backend.
+    """
+    page_cache.init_app(
+        app,
+        maxsize=app.config.get("PAGE_CACHE_SIZE"),
+        ttl=app.config.get("PAGE_CACHE_TTL"),
+    )
+    cart_cache.init_app(
+        app,
+        maxsize=app.config.get("CART_CACHE_SIZE"),
+        ttl=app.config.get("CART_CACHE_TTL"),
+    )
+    user_cache.init_app(
+        app,
+        maxsize=app.config.get("USER_CACHE_SIZE"),
+        ttl=app.config.get("USER_CACHE_TTL"),
+    )
+    facet_cache.init_app(app, ttl=app.config.get("FACET_CACHE_TTL"))
+    product_cache.init_app(
+        app,
+        maxsize=app.config.get("PRODUCT_CACHE_SIZE"),
+        ttl=app.config.get("PRODUCT_CACHE_TTL"),
+    )
+    catalog_changed.connect(_clear_pages)
+    catalog_changed.connect(_clear_facets)
+    catalog_changed.connect(_clear_products)
+    catalog_changed.connect(_clear_carts)
@@ -7,12 +7,104 @@ updating the quantity of items in the cart, and removing items from the cart.
 
 from flask import Blueprint, flash, render_template, redirect, url_for
 from flask_login import current_user, login_required
+from sqlalchemy import literal
+from ourapp.db_utils import supports_upsert, upsert, upsert_increment
 from ourapp.extensions import db
 from ourapp.models import CartItem, Product
 from ourapp.logging_config.config import logger
+from ourapp import recommendations, trending
+from .summary import forget_cart, get_cart_summary
 
 cart_bp = Blueprint("cart", __name__, template_folder="templates", url_prefix="/cart")
 
+cart_items = CartItem.__table__
+
+
+def _cart_line(product_id):
+    """
+    Condition selecting the current user's cart line for a product.
+    """
+    return (cart_items.c.customer_id == current_user.id) & (
+        cart_items.c.product_id == product_id
+    )
+
+
+def _delete_cart_line(product_id, condition=None):
+    """
+    Delete the current user's cart line for a product.
+
+    Returns:
+        bool: True if a line was deleted.
+    """
+    stmt = db.delete(cart_items).where(_cart_line(product_id))
+    if condition is not None:
+        stmt = stmt.where(condition)
+    deleted = db.session.execute(stmt).rowcount > 0
+    if deleted:
+        trending.record_cart_remove(product_id)
+    return deleted
+
+
+def _add_cart_line(product_id):
+    """
+    Create the current user's cart line for a product, or increment its
+    quantity, if the product exists.
+
+    Returns:
+        int: The new quantity, or None if there is no such product.
+    """
+    if supports_upsert():
+        # One statement that only inserts when the product exists
+        stmt = upsert(cart_items).from_select(
+            ["customer_id", "product_id", "quantity"],
+            db.select(literal(current_user.id), Product.id, literal(1)).where(
+                Product.id == product_id
+            ),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["customer_id", "product_id"],
+            set_={"quantity": cart_items.c.quantity + 1},
+        ).returning(cart_items.c.quantity)
+        return db.session.execute(stmt).scalar()
+
+    if db.session.get(Product, product_id) is None:
+        return None
+    upsert_increment(
+        cart_items,
+        [{"customer_id": current_user.id, "product_id": product_id, "quantity": 1}],
+        ["customer_id", "product_id"],
+        ["quantity"],
+    )
+    return db.session.execute(
+        db.select(cart_items.c.quantity).where(_cart_line(product_id))
+    ).scalar()
+
+
+def _update_cart_line(product_id, change, condition=None):
+    """
+    Add ``change`` to the quantity of the current user's cart line for a
+    product.
+
+    Returns:
+        int: The new quantity, or None if no line was updated.
+    """
+    stmt = (
+        db.update(cart_items)
+        .where(_cart_line(product_id))
+        .values(quantity=cart_items.c.quantity + change)
+    )
+    if condition is not None:
+        stmt = stmt.where(condition)
+    if supports_upsert():
+        # The databases with upserts also support UPDATE ... RETURNING
+        return db.session.execute(stmt.returning(cart_items.c.quantity)).scalar()
+
+    if db.session.execute(stmt).rowcount == 0:
+        return None
+    return db.session.execute(
+        db.select(cart_items.c.quantity).where(_cart_line(product_id))
+    ).scalar()
+
 
 @cart_bp.route("/add-to-cart/<int:product_id>")
 @login_required
@@ -20,6 +112,9 @@ def add_to_cart(product_id):
     """
     Add a product to the shopping cart.
 
+    The cart line is created, or its quantity incremented, by an upsert
+    that only inserts when the product exists.
+
     Args:
         id (int): The ID of the product to add to the cart.
 
@@ -27,39 +122,19 @@ def add_to_cart(product_id):
         Redirects to the view cart page after adding the product to the cart.
 
     """
-    product = Product.query.filter_by(id=product_id).first()
-    if product:
-        # Check if product is already in the cart
-        cart_item = CartItem.query.filter_by(
-            product_id=product_id, customer_id=current_user.id
-        ).first()
-        if cart_item:
-            cart_item.quantity += 1
-            logger.info(
-                "Incremented quantity of product %s(%s) in the cart for user %s(%s)",
-                product.name,
-                product.id,
-                current_user.fname,
-                current_user.id,
-            )
-        else:
-            new_cart_item = CartItem(product_id=product_id, customer_id=current_user.id)
-            db.session.add(new_cart_item)
-            logger.info(
-                "Added product %s(%s) to the cart for user %s(%s)",
-                product.name,
-                product.id,
-                current_user.fname,
-                current_user.id,
-            )
+    quantity = _add_cart_line(product_id)
+    if quantity is not None:
+        if quantity == 1:
+            trending.record_cart_add(product_id)
         db.session.commit()
+        forget_cart(current_user.id)
         flash(message="Product added to the cart!", category="success")
         logger.info(
-            "Product %s(%s) added to the cart for user %s(%s)",
-            product.id,
-            product.name,
+            "Product %s added to the cart for user %s(%s), quantity %s",
+            product_id,
             current_user.fname,
             current_user.id,
+            quantity,
         )
 
     return redirect(url_for("cart.view_cart"))
@@ -75,12 +150,15 @@ def view_cart():
         Renders the view cart template with the cart items and total cart value.
 
     """
-    cart = current_user.cart
-    cart_total = 0
-    for cartitem in cart:
-        cart_total += cartitem.product.price * cartitem.quantity
-        logger.info("Viewing cart for user %s(%s)", current_user.fname, current_user.id)
-    return render_template("cart/view_cart.html", cart=cart, cart_total=cart_total)
+    cart = get_cart_summary()
+    also_bought = recommendations.also_bought(line.product.id for line in cart.items)
+    logger.info("Viewing cart for user %s(%s)", current_user.fname, current_user.id)
+    return render_template(
+        "cart/view_cart.html",
+        cart=cart.items,
+        cart_total=cart.total,
+        also_bought=also_bought,
+    )
 
 
 @cart_bp.route("/increment/<int:product_id>")
@@ -96,22 +174,16 @@ def increment(product_id):
         Redirects to the view cart page after incrementing the quantity.
 
     """
-    product = Product.query.filter_by(id=product_id).first()
-    if product:
-        # Check if product is already in the cart
-        cart_item = CartItem.query.filter_by(
-            product_id=product_id, customer_id=current_user.id
-        ).first()
-        if cart_item:
-            cart_item.quantity += 1
-            db.session.commit()
-            logger.info(
-                "Incremented quantity of product %s(%s) in the cart for user %s(%s)",
-                product.name,
-                product.id,
-                current_user.fname,
-                current_user.id,
-            )
+    quantity = _update_cart_line(product_id, 1)
+    if quantity is not None:
+        db.session.commit()
+        forget_cart(current_user.id)
+        logger.info(
+            "Incremented quantity of product %s in the cart for user %s(%s)",
+            product_id,
+            current_user.fname,
+            current_user.id,
+        )
     return redirect(url_for("cart.view_cart"))
 
 
@@ -129,24 +201,19 @@ def decrement(product_id):
         quantity becomes zero, the item is removed from the cart.
 
     """
-    product = Product.query.filter_by(id=product_id).first()
-    if product:
-        # Check if product is already in the cart
-        cart_item = CartItem.query.filter_by(
-            product_id=product_id, customer_id=current_user.id
-        ).first()
-        if cart_item:
-            cart_item.quantity -= 1
-            if cart_item.quantity == 0:
-                return redirect(url_for("cart.remove", product_id=product.id))
-            db.session.commit()
-            logger.info(
-                "Decremented quantity of product %s(%s) in the cart for user %s(%s)",
-                product.name,
-                product.id,
-                current_user.fname,
-                current_user.id,
-            )
+    quantity = _update_cart_line(product_id, -1, cart_items.c.quantity > 1)
+    # Nothing to decrement means the line is missing or down to its last unit
+    if quantity is None and _delete_cart_line(product_id, cart_items.c.quantity <= 1):
+        quantity = 0
+    if quantity is not None:
+        db.session.commit()
+        forget_cart(current_user.id)
+        logger.info(
+            "Decremented quantity of product %s in the cart for user %s(%s)",
+            product_id,
+            current_user.fname,
+            current_user.id,
+        )
     return redirect(url_for("cart.view_cart"))
 
 
@@ -163,22 +230,13 @@ def remove(product_id):
         Redirects to the view cart page after removing the product from the cart.
 
     """
-    product = Product.query.filter_by(id=product_id).first()
-    if product:
-        # Check if product is already in the cart
-        cart_item = CartItem.query.filter_by(
-            product_id=product_id, customer_id=current_user.id
-        ).first()
-        if cart_item:
-            CartItem.query.filter_by(
-                product_id=product_id, customer_id=current_user.id
-            ).delete()
-            db.session.commit()
-            logger.info(
-                "Removed product %s(%s) from the cart for user %s(%s)",
-                product.name,
-                product.id,
-                current_user.fname,
-                current_user.id,
-            )
+    if _delete_cart_line(product_id):
+        db.session.commit()
+        forget_cart(current_user.id)
+        logger.info(
+            "Removed product %s from the cart for user %s(%s)",
+            product_id,
+            current_user.fname,
+            current_user.id,
+        )
     return redirect(url_for("cart.view_cart"))
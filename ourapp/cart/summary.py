@@ -0,0 +1,99 @@
+"""
+Cart summary shared by the cart, payment and order views.
+
+The lines of a cart, the products they hold and the cart total are read
+with one joined query and kept on ``flask.g`` for the rest of the request.
+Unless CART_CACHE_ENABLED is false the summary is also kept in the cart
+cache between requests. Changing the cart or placing an order drops the
+cached summary, and the next read loads it again. Drop-on-write avoids a
+read-modify-write of the cached entry, which would lose one of two
+concurrent changes.
+
+A cached summary is only consistent within one process (see
+``ourapp.cache``), so it is used for display. Placing an order reads the
+cart with ``load_cart_summary``.
+"""
+
+from collections import namedtuple
+
+from flask import current_app, g
+from flask_login import current_user
+from sqlalchemy import func
+
+from ourapp.cache import cart_cache
+from ourapp.extensions import db
+from ourapp.models import CartItem, Product
+
+CartProduct = namedtuple("CartProduct", ["id", "name", "price", "image_url"])
+CartLine = namedtuple("CartLine", ["product", "quantity"])
+CartSummary = namedtuple("CartSummary", ["items", "total", "count"])
+
+
+def cart_summary_query(customer_id):
+    """
+    Build the query reading a customer's cart lines with the cart total.
+    """
+    cart_total = func.sum(Product.price * CartItem.quantity).over()
+    return (
+        db.session.query(
+            Product.id,
+            Product.name,
+            Product.price,
+            Product.image_url,
+            CartItem.quantity,
+            cart_total,
+        )
+        .join(Product, Product.id == CartItem.product_id)
+        .filter(CartItem.customer_id == customer_id)
+        .order_by(CartItem.id)
+    )
+
+
+def load_cart_summary(customer_id):
+    """
+    Read a customer's cart from the database.
+
+    Args:
+        customer_id (int): The ID of the customer.
+
+    Returns:
+        CartSummary: The cart lines, the cart total and the number of units.
+    """
+    rows = cart_summary_query(customer_id).all()
+    items = [
+        CartLine(CartProduct(product_id, name, price, image_url), quantity)
+        for product_id, name, price, image_url, quantity, _ in rows
+    ]
+    total = rows[0][-1] if rows else 0
+    return CartSummary(items, total, sum(line.quantity for line in items))
+
+
+def _cache_enabled():
+    return current_app.config.get("CART_CACHE_ENABLED", True)
+
+
+def get_cart_summary():
+    """
+    Get the current user's cart, read at most once per request.
+
+    Returns:
+        CartSummary: The cart lines, the cart total and the number of units.
+    """
+    if "cart_summary" not in g:
+        key = str(current_user.id)
+        cart = cart_cache.get(key) if _cache_enabled() else None
+        if cart is None:
+            cart = load_cart_summary(current_user.id)
+            if _cache_enabled():
+                cart_cache.set(key, cart)
+        g.cart_summary = cart
+    return g.cart_summary
+
+
+def forget_cart(customer_id):
+    """
+    Drop a customer's cached cart.
+    """
+    g.pop("cart_summary", None)
+    if _cache_enabled():
+        cart_cache.delete(str(customer_id))
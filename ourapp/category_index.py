@@ -0,0 +1,100 @@
+"""
+Category membership index.
+
+Maps each category name (lowercased) to the ids of its products, newest
+first, so category listings can fetch their products with a single ``IN``
+query instead of looking the category up and joining through
+``product_category`` on every request.
+
+The index is built when the application starts and rebuilt in a
+background thread whenever a committed change may have altered category
+membership; listings use the previous index until the new one is swapped
+in. Each process keeps its own copy; other processes do not hear about the
+change, but with CATEGORY_INDEX_TTL set they refresh their copy once it is
+that old.
+
+Configuration:
+    CATEGORY_INDEX_TTL (int): Seconds after which a lookup starts a
+    background refresh of the index; 0 (the default) only refreshes it
+    after a change made by the same process.
+"""
+
+from sqlalchemy import select
+
+from ourapp.cache import MemoryIndex
+from ourapp.models import Category, product_category
+from ourapp.signals import catalog_changed
+
+
+def build_index(connection):
+    """
+    Build the membership index from the category association table.
+
+    Args:
+        connection: A database connection to read the memberships from.
+
+    Returns:
+        dict: Lowercased category name to a list of product ids, newest first.
+    """
+    members = {
+        name: [] for (name,) in connection.execute(select(Category.name_normalized))
+    }
+    rows = connection.execute(
+        select(Category.name_normalized, product_category.c.product_id)
+        .join_from(Category, product_category)
+        .order_by(product_category.c.product_id.desc())
+    )
+    for name, product_id in rows:
+        members[name].append(product_id)
+    return members
+
+
+membership_index = MemoryIndex(build_index)
+
+
+def _first_below(product_ids, before):
+    """
+    Position of the first id smaller than ``before`` in a descending list.
+    """
+    low, high = 0, len(product_ids)
+    while low < high:
+        middle = (low + high) // 2
+        if product_ids[middle] >= before:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def category_product_ids(name, limit=None, before=None):
+    """
+    Get the ids of the products in a category, newest first.
+
+    Args:
+        name (str): The name of the category, in any case.
+        limit (int): The maximum number of ids to return.
+        before (int): Only return ids smaller than this cursor.
+
+    Returns:
+        List: Product ids, or an empty list if there is no such category.
+    """
+    product_ids = membership_index.get().get(name.strip().lower(), [])
+    if before is not None:
+        product_ids = product_ids[_first_below(product_ids, before):]
+    if limit is not None:
+        product_ids = product_ids[:limit]
+    return list(product_ids)
+
+
+def _refresh_on_change(sender, categories_changed, **extra):  # pylint: disable=unused-argument
+    if categories_changed:
+        membership_index.refresh()
+
+
+def init_category_index(app):
+    """
+    Load the category membership index and keep it in step with catalog
+    changes.
+    """
+    membership_index.init_app(app, ttl=app.config.get("CATEGORY_INDEX_TTL"))
+    catalog_changed.connect(_refresh_on_change)
@@ -0,0 +1,141 @@
+"""
+Command line maintenance commands, available through ``flask <command>``.
+"""
+
+import click
+
+from ourapp import bulk, query_plans, recommendations, search, seed, trending
+
+
+@click.command("rebuild-trending")
+def rebuild_trending():
+    """
+    Recompute the trending counters from current carts and past orders.
+    """
+    rows = trending.rebuild()
+    click.echo(f"Rebuilt {rows} trending counter rows.")
+
+
+@click.command("rebuild-recommendations")
+@click.option(
+    "--neighbours",
+    type=int,
+    default=None,
+    help="Neighbours kept per product (default: RECOMMENDATION_NEIGHBOURS).",
+)
+def rebuild_recommendations(neighbours):
+    """
+    Recompute the "customers also bought" table from past orders, keeping
+    each product's top neighbours. Run it periodically to trim the pairs
+    added at checkout.
+    """
+    rows = recommendations.rebuild(neighbours)
+    click.echo(f"Rebuilt {rows} recommendation rows.")
+
+
+@click.command("rebuild-search-index")
+def rebuild_search_index():
+    """
+    Rebuild the product search index from the product table.
+    """
+    count = search.rebuild_index()
+    click.echo(f"Indexed {count} products.")
+
+
+@click.command("query-plans")
+def show_query_plans():
+    """
+    Print the database's query plan for each blueprint query.
+    """
+    for line in query_plans.report():
+        click.echo(line)
+
+
+def _file_format(file_format, stream):
+    return file_format or bulk.guess_format(getattr(stream, "name", ""))
+
+
+@click.command("import-products")
+@click.argument("source", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "file_format", type=click.Choice(bulk.FORMATS), default=None,
+              help="File format (default: from the file extension).")
+@click.option("--chunk-size", type=int, default=bulk.DEFAULT_CHUNK_SIZE,
+              show_default=True, help="Rows inserted per transaction.")
+def import_products(source, file_format, chunk_size):
+    """
+    Import products and their categories from a CSV or JSON Lines file.
+    """
+    try:
+        count = bulk.import_products(source, _file_format(file_format, source), chunk_size)
+    except bulk.InvalidRowError as error:
+        raise click.ClickException(str(error)) from error
+    click.echo(f"Imported {count} products.", err=True)
+
+
+@click.command("export")
+@click.argument("table", type=click.Choice(["products", *bulk.EXPORTABLE_TABLES]))
+@click.argument("destination", type=click.File("w", encoding="utf-8"), default="-")
+@click.option("--format", "file_format", type=click.Choice(bulk.FORMATS), default=None,
+              help="File format (default: from the file extension, else CSV).")
+@click.option("--chunk-size", type=int, default=bulk.DEFAULT_CHUNK_SIZE,
+              show_default=True, help="Rows fetched per round trip.")
+def export(table, destination, file_format, chunk_size):
+    """
+    Export products, orders or ordered items to a CSV or JSON Lines file.
+    """
+    file_format = _file_format(file_format, destination)
+    if table == "products":
+        count = bulk.export_products(destination, file_format, chunk_size)
+    else:
+        count = bulk.export_table(
+            bulk.EXPORTABLE_TABLES[table], destination, file_format, chunk_size
+        )
+    click.echo(f"Exported {count} {table}.", err=True)
+
+
+@click.command("seed")
+@click.option("--categories", type=int, default=10, show_default=True,
+              help="Categories to make sure exist.")
+@click.option("--products", type=int, default=1000, show_default=True,
+              help="Products to create.")
+@click.option("--customers", type=int, default=1000, show_default=True,
+              help="Customers to create.")
+@click.option("--orders", type=int, default=10000, show_default=True,
+              help="Orders to create.")
+@click.option("--carts", type=int, default=100, show_default=True,
+              help="Created customers given a non-empty cart.")
+@click.option("--max-items", type=int, default=4, show_default=True,
+              help="Most products in one cart or order.")
+@click.option("--days", type=int, default=365, show_default=True,
+              help="How many days back order dates go.")
+@click.option("--exponent", type=float, default=seed.DEFAULT_EXPONENT, show_default=True,
+              help="Zipf skew of category, product and customer popularity.")
+@click.option("--batch-size", type=int, default=seed.DEFAULT_BATCH_SIZE,
+              show_default=True, help="Rows inserted per transaction.")
+@click.option("--rebuild/--no-rebuild", default=True, show_default=True,
+              help="Rebuild trending counters and recommendations afterwards.")
+@click.option("--seed", "random_seed", type=int, default=None,
+              help="Seed of the random generator, for repeatable data.")
+def seed_data(**options):
+    """
+    Fill the database with synthetic, popularity-skewed data for load testing.
+    """
+    try:
+        counts = seed.seed(**options)
+    except ValueError as error:
+        raise click.ClickException(str(error)) from error
+    for table, count in counts._asdict().items():
+        click.echo(f"{table.replace('_', ' ')}: {count}")
+
+
+def register_commands(app):
+    """
+    Register the maintenance commands on the application.
+    """
+    app.cli.add_command(rebuild_trending)
+    app.cli.add_command(import_products)
+    app.cli.add_command(export)
+    app.cli.add_command(rebuild_recommendations)
+    app.cli.add_command(rebuild_search_index)
+    app.cli.add_command(show_query_plans)
+    app.cli.add_command(seed_data)
@@ -0,0 +1,143 @@
+"""
+Database engine configuration, applied by ``init_db``.
+
+``engine_options`` turns the DB_* settings into SQLAlchemy engine options
+for server databases (PostgreSQL, MySQL, ...): a sized connection pool whose
+connections are recycled and checked before use. ``configure_engine`` makes
+every new SQLite connection run PRAGMAs suited to a web application: WAL
+journaling so readers do not block the writer, NORMAL synchronous writes, a
+busy timeout so concurrent writers wait for the lock instead of failing with
+"database is locked", and memory-mapped I/O and a larger page cache.
+
+Like every setting, these can be set from the environment with the FLASK_
+prefix, e.g. FLASK_DB_POOL_SIZE=20 or FLASK_SQLALCHEMY_DATABASE_URI=...
+
+Configuration:
+    DB_POOL_SIZE (int): Connections kept open per process.
+    DB_MAX_OVERFLOW (int): Extra connections opened under load.
+    DB_POOL_TIMEOUT (int): Seconds to wait for a free connection.
+    DB_POOL_RECYCLE (int): Seconds after which a connection is replaced,
+    so it is closed before the server drops it; -1 never recycles.
+    DB_POOL_PRE_PING (bool): Test connections before handing them out.
+    SQLITE_JOURNAL_MODE (str): Journal mode, e.g. "WAL" or "DELETE".
+    SQLITE_SYNCHRONOUS (str): "OFF", "NORMAL", "FULL" or "EXTRA".
+    SQLITE_BUSY_TIMEOUT (int): Milliseconds to wait for a lock.
+    SQLITE_MMAP_SIZE (int): Bytes of the database file memory-mapped, 0
+    disables memory-mapped I/O.
+    SQLITE_CACHE_SIZE (int): Page cache size: pages if positive, KiB if
+    negative.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+POOL_DEFAULTS = {
+    "DB_POOL_SIZE": 10,
+    "DB_MAX_OVERFLOW": 20,
+    "DB_POOL_TIMEOUT": 30,
+    "DB_POOL_RECYCLE": 1800,
+    "DB_POOL_PRE_PING": True,
+}
+SQLITE_DEFAULTS = {
+    "SQLITE_JOURNAL_MODE": "WAL",
+    "SQLITE_SYNCHRONOUS": "NORMAL",
+    "SQLITE_BUSY_TIMEOUT": 5000,
+    "SQLITE_MMAP_SIZE": 256 * 1024 * 1024,
+    "SQLITE_CACHE_SIZE": -64000,
+}
+
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def _setting(config, defaults, key):
+    return config.get(key, defaults[key])
+
+
+def engine_options(config):
+    """
+    Build the SQLAlchemy engine options for the configured database.
+
+    Options already set in SQLALCHEMY_ENGINE_OPTIONS take precedence.
+
+    Args:
+        config (dict): The application configuration.
+
+    Returns:
+        dict: Keyword arguments for ``create_engine``.
+    """
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    options = {}
+    if url.get_backend_name() != "sqlite":
+        options = {
+            "pool_size": int(_setting(config, POOL_DEFAULTS, "DB_POOL_SIZE")),
+            "max_overflow": int(_setting(config, POOL_DEFAULTS, "DB_MAX_OVERFLOW")),
+            "pool_timeout": int(_setting(config, POOL_DEFAULTS, "DB_POOL_TIMEOUT")),
+            "pool_recycle": int(_setting(config, POOL_DEFAULTS, "DB_POOL_RECYCLE")),
+            "pool_pre_ping": bool(_setting(config, POOL_DEFAULTS, "DB_POOL_PRE_PING")),
+        }
+    options.update(config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    return options
+
+
+def sqlite_pragmas(config, in_memory=False):
+    """
+    Build the PRAGMA statements run on each new SQLite connection.
+
+    Args:
+        config (dict): The application configuration.
+        in_memory (bool): Whether the database is in memory, which has no
+        file to journal to.
+
+    Returns:
+        list: The PRAGMA statements.
+
+    Raises:
+        ValueError: The journal or synchronous mode is not a SQLite mode.
+    """
+    journal_mode = str(_setting(config, SQLITE_DEFAULTS, "SQLITE_JOURNAL_MODE")).upper()
+    if journal_mode not in JOURNAL_MODES:
+        raise ValueError(f"Unknown SQLite journal mode {journal_mode!r}")
+    synchronous = str(_setting(config, SQLITE_DEFAULTS, "SQLITE_SYNCHRONOUS")).upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"Unknown SQLite synchronous mode {synchronous!r}")
+    # The busy timeout comes first so the journal mode change can wait
+    pragmas = [
+        f"PRAGMA busy_timeout = {int(_setting(config, SQLITE_DEFAULTS, 'SQLITE_BUSY_TIMEOUT'))}"
+    ]
+    if not in_memory:
+        pragmas.append(f"PRAGMA journal_mode = {journal_mode}")
+    pragmas += [
+        f"PRAGMA synchronous = {synchronous}",
+        f"PRAGMA mmap_size = {int(_setting(config, SQLITE_DEFAULTS, 'SQLITE_MMAP_SIZE'))}",
+        f"PRAGMA cache_size = {int(_setting(config, SQLITE_DEFAULTS, 'SQLITE_CACHE_SIZE'))}",
+    ]
+    return pragmas
+
+
+def configure_engine(engine, config):
+    """
+    Make every new connection of a SQLite engine run the configured PRAGMAs.
+    Engines of other databases are left as they are.
+
+    Args:
+        engine (Engine): The engine to configure.
+        config (dict): The application configuration.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas(
+        config,
+        in_memory=engine.url.database in (None, "", ":memory:")
+        or engine.url.query.get("mode") == "memory",
+    )
+
+    def run_pragmas(dbapi_connection, connection_record):  # pylint: disable=unused-argument
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    event.listen(engine, "connect", run_pragmas)
@@ -0,0 +1,104 @@
+"""
+Helpers for SQL that differs between database backends.
+"""
+
+from sqlalchemy import and_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from ourapp.extensions import db
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+ON_CONFLICT_DIALECTS = ("sqlite", "postgresql")
+
+
+def _dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+def supports_upsert():
+    """
+    Whether the current database supports the statements built by ``upsert``.
+    """
+    return _dialect_name() in ON_CONFLICT_DIALECTS
+
+
+def upsert(table):
+    """
+    Build an INSERT statement for the current database that supports
+    ``on_conflict_do_update`` / ``on_conflict_do_nothing``.
+
+    Callers that must also run on other databases check ``supports_upsert``
+    first, or use ``upsert_increment``.
+
+    Args:
+        table: The model or table to insert into.
+
+    Returns:
+        Insert: A dialect-specific insert statement.
+
+    Raises:
+        NotImplementedError: If the database does not support upserts.
+    """
+    dialect = _dialect_name()
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    raise NotImplementedError(f"Upserts are not supported on {dialect}")
+
+
+def upsert_increment(table, rows, index_elements, counters):
+    """
+    Insert rows, or add their counter values to the existing rows with the
+    same key. The caller commits.
+
+    SQLite and PostgreSQL use INSERT ... ON CONFLICT DO UPDATE and MySQL
+    INSERT ... ON DUPLICATE KEY UPDATE, one executemany statement for all
+    rows. Other databases update each row and insert it when there was
+    nothing to update, inside a savepoint so a concurrent insert of the same
+    key turns into an update.
+
+    Args:
+        table: The model or table to write to.
+        rows (list): Dictionaries with the key and counter columns.
+        index_elements (list): Names of the columns of the unique key.
+        counters (list): Names of the columns added to.
+    """
+    if not rows:
+        return
+    table = getattr(table, "__table__", table)
+    dialect = _dialect_name()
+    if dialect in ON_CONFLICT_DIALECTS:
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={name: table.c[name] + stmt.excluded[name] for name in counters},
+        )
+        db.session.execute(stmt, rows)
+    elif dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update(
+            {name: table.c[name] + stmt.inserted[name] for name in counters}
+        )
+        db.session.execute(stmt, rows)
+    else:
+        for row in rows:
+            _update_or_insert(table, row, index_elements, counters)
+
+
+def _update_or_insert(table, row, index_elements, counters):
+    key = and_(*[table.c[name] == row[name] for name in index_elements])
+    update = (
+        db.update(table)
+        .where(key)
+        .values({name: table.c[name] + row[name] for name in counters})
+    )
+    if db.session.execute(update).rowcount:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(db.insert(table), [row])
+    except IntegrityError:
+        # Another transaction inserted the row since the update
+        db.session.execute(update)
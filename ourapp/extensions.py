@@ -17,22 +17,29 @@ The initialized extensions are:
     - admin (Admin):
         Flask-Admin instance for administrative interfaces.
 """
-# from flask_migrate import Migrate
+from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_sqlalchemy import SQLAlchemy
 
-# migrate = Migrate()
+from ourapp.database import configure_engine, engine_options
+
+migrate = Migrate()
 login_manager = LoginManager()
 db = SQLAlchemy()
 
 def init_db(app):
     '''
-    Initializes the database
+    Initializes the database, with the engine options and SQLite PRAGMAs
+    configured for the application (see ourapp.database)
     '''
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
     db.init_app(app=app)
+    migrate.init_app(app=app, db=db)
 
-    # Create the database tables
     with app.app_context():
+        for engine in db.engines.values():
+            configure_engine(engine, app.config)
+        # Create the database tables
         db.create_all()
 
 def init_login_manager(app):
@@ -0,0 +1,145 @@
+"""
+Allocation of the random-looking 7 digit ids given to customers and orders.
+
+Ids are produced by running a plain counter through a keyed Feistel
+permutation of the 9,000,000 possible ids, so consecutive customers get
+unrelated ids but two counter values can never map to the same id. Counter
+values are reserved from the IdSequence table in blocks, in their own
+transaction, so most allocations are served from memory without a query
+and concurrent workers never hand out the same id.
+
+Configuration:
+    ID_BLOCK_SIZE (int): How many counter values are reserved at a time.
+    ID_PERMUTATION_KEY (str): Key of the permutation. It must not change once
+    ids have been issued.
+"""
+
+import hashlib
+import threading
+from collections import deque
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from ourapp.extensions import db
+from ourapp.models import Customer, IdSequence, Order
+
+ID_MIN = 10**6
+ID_SPACE = 9 * 10**6  # 1000000 to 9999999
+
+_HALF_BITS = 12  # 2 ** 24 is the smallest even power of two above ID_SPACE
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+DEFAULT_PERMUTATION_KEY = "whatever-id-permutation"
+
+
+def _round(key, round_no, value):
+    digest = hashlib.blake2b(
+        value.to_bytes(2, "big"), key=key, digest_size=2, person=bytes([round_no]) * 16
+    ).digest()
+    return int.from_bytes(digest, "big") & _HALF_MASK
+
+
+def permute(counter, key):
+    """
+    Map a counter value in [0, ID_SPACE) to a unique id in [ID_MIN, ID_MIN + ID_SPACE).
+
+    Args:
+        counter (int): The counter value.
+        key (bytes): The permutation key.
+
+    Returns:
+        int: The permuted id.
+    """
+    value = counter
+    # Cycle-walk: the 24 bit permutation is applied again until it lands
+    # inside the id space, which keeps the mapping a bijection
+    while True:
+        left, right = value >> _HALF_BITS, value & _HALF_MASK
+        for round_no in range(_ROUNDS):
+            left, right = right, left ^ _round(key, round_no, right)
+        value = (left << _HALF_BITS) | right
+        if value < ID_SPACE:
+            return ID_MIN + value
+
+
+class IdAllocator:
+    """
+    Hands out unique ids for one model, reserving counter blocks as needed.
+    """
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+        self._ids = deque()
+        self._lock = threading.Lock()
+
+    def allocate(self):
+        """
+        Get a new unique id.
+        """
+        return self.allocate_many(1)[0]
+
+    def allocate_many(self, count):
+        """
+        Get ``count`` new unique ids.
+        """
+        with self._lock:
+            while len(self._ids) < count:
+                self._refill(max(count, current_app.config.get("ID_BLOCK_SIZE", 100)))
+            return [self._ids.popleft() for _ in range(count)]
+
+    def reset(self):
+        """
+        Forget the ids reserved by this process.
+        """
+        with self._lock:
+            self._ids.clear()
+
+    def _refill(self, size):
+        start = self._reserve(size)
+        key = current_app.config.get("ID_PERMUTATION_KEY", DEFAULT_PERMUTATION_KEY)
+        key = hashlib.sha256(key.encode()).digest()
+        ids = [permute(counter, key) for counter in range(start, start + size)]
+        # Ids issued before this allocator existed were picked at random, so
+        # skip any of those the new block happens to hit
+        taken = {
+            id_
+            for (id_,) in db.session.query(self.model.id).filter(self.model.id.in_(ids))
+        }
+        self._ids.extend(id_ for id_ in ids if id_ not in taken)
+
+    def _reserve(self, size):
+        """
+        Reserve ``size`` counter values in a separate transaction.
+
+        Returns:
+            int: The first reserved counter value.
+        """
+        table = IdSequence.__table__
+        while True:
+            try:
+                with db.engine.begin() as connection:
+                    updated = connection.execute(
+                        table.update()
+                        .where(table.c.name == self.name)
+                        .values(next_value=table.c.next_value + size)
+                    ).rowcount
+                    if not updated:
+                        connection.execute(
+                            table.insert().values(name=self.name, next_value=size)
+                        )
+                    end = connection.execute(
+                        db.select(table.c.next_value).where(table.c.name == self.name)
+                    ).scalar_one()
+            except IntegrityError:
+                # Another worker created the counter first
+                continue
+            if end > ID_SPACE:
+                raise RuntimeError(f"No {self.name} ids left to allocate")
+            return end - size
+
+
+customer_ids = IdAllocator("customer", Customer)
+order_ids = IdAllocator("order", Order)
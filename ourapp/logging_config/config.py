@@ -1,10 +1,231 @@
+"""
+Application logging.
+
+Blueprints log through ``logger``. ``init_logging`` (called by the app
+factory) gives it a QueueHandler, so a log call only puts the record on an
+in-memory queue; a background thread writes queued records in batches to
+stderr and to a size-rotated file, flushing once per batch.
+
+High-volume info logs can be sampled per endpoint; warnings and errors are
+always kept.
+
+Configuration:
+    LOG_LEVEL (str): Lowest level logged, e.g. "INFO".
+    LOG_FILE (str): Path of the log file, or None to only log to stderr.
+    LOG_MAX_BYTES (int): Size at which the log file is rotated.
+    LOG_BACKUP_COUNT (int): Number of rotated files kept.
+    LOG_FORMAT (str): "text", or "json" for one JSON object per line.
+    LOG_TO_STDERR (bool): Whether records are also written to stderr.
+    LOG_BATCH_SIZE (int): Maximum records written between two flushes.
+    LOG_SAMPLE_RATES (dict): Endpoint to the fraction of its info and debug
+    records that are kept, e.g. {"cart.view_cart": 0.1}.
+"""
+
+import atexit
+import json
 import logging
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+
+from flask import has_request_context, request
 
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
-file_handler = logging.FileHandler('app.log')
-file_handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+logger.setLevel(logging.INFO)
+
+_STOP = object()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        endpoint = getattr(record, "endpoint", None)
+        if endpoint:
+            entry["endpoint"] = endpoint
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+
+class _BatchFlushMixin:
+    """
+    Defer a stream handler's flush to the end of the writer's batch.
+    """
+
+    def flush(self):
+        """
+        Do nothing; the writer calls ``flush_batch`` after each batch.
+        """
+
+    def flush_batch(self):
+        """
+        Flush the records written since the last batch.
+        """
+        try:
+            super().flush()
+        except (OSError, ValueError):
+            # The stream was closed under us, e.g. stderr at interpreter exit
+            pass
+
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+
+class BatchedStreamHandler(_BatchFlushMixin, logging.StreamHandler):
+    """
+    StreamHandler flushed once per batch.
+    """
+
+
+class BatchedRotatingFileHandler(_BatchFlushMixin, RotatingFileHandler):
+    """
+    RotatingFileHandler flushed once per batch.
+    """
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the info and debug records logged by some endpoints.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = dict(rates)
+
+    def filter(self, record):
+        endpoint = request.endpoint if has_request_context() else None
+        record.endpoint = endpoint
+        if record.levelno > logging.INFO or endpoint not in self.rates:
+            return True
+        return random.random() < self.rates[endpoint]
+
+
+class BatchingQueueListener:
+    """
+    Background thread writing queued records to handlers in batches.
+    """
+
+    def __init__(self, record_queue, handlers, batch_size=100):
+        self.queue = record_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread = None
+
+    def start(self):
+        """
+        Start the writer thread.
+        """
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Write the records still queued and stop the writer thread.
+        """
+        if self._thread is not None:
+            self.queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+            for handler in self.handlers:
+                handler.close()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [record for record in batch if record is not _STOP]
+            for record in batch:
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            for handler in self.handlers:
+                handler.flush_batch()
+
+
+_pipeline = {"listener": None, "handler": None}
+
+
+def stop_logging():
+    """
+    Flush queued records and remove the queue handler from ``logger``.
+    """
+    if _pipeline["handler"] is not None:
+        logger.removeHandler(_pipeline["handler"])
+        _pipeline["handler"] = None
+    if _pipeline["listener"] is not None:
+        _pipeline["listener"].stop()
+        _pipeline["listener"] = None
+
+
+def init_logging(app):
+    """
+    Route ``logger`` through a queue to a background writer, as configured
+    for ``app``. Calling it again replaces the previous pipeline.
+    """
+    stop_logging()
+    config = app.config
+    if config.get("LOG_FORMAT", "text") == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    handlers = []
+    if config.get("LOG_TO_STDERR", True):
+        handlers.append(BatchedStreamHandler(sys.stderr))
+    log_file = config.get("LOG_FILE", "app.log")
+    if log_file:
+        handlers.append(
+            BatchedRotatingFileHandler(
+                log_file,
+                maxBytes=config.get("LOG_MAX_BYTES", 10 * 1024 * 1024),
+                backupCount=config.get("LOG_BACKUP_COUNT", 5),
+                encoding="utf-8",
+            )
+        )
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    record_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(record_queue)
+    sample_rates = config.get("LOG_SAMPLE_RATES")
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+    listener = BatchingQueueListener(
+        record_queue, handlers, batch_size=config.get("LOG_BATCH_SIZE", 100)
+    )
+    listener.start()
+
+    logger.setLevel(config.get("LOG_LEVEL", "INFO"))
+    logger.addHandler(queue_handler)
+    # The queue handler replaces the root logger's blocking handlers
+    logger.propagate = False
+    _pipeline["listener"] = listener
+    _pipeline["handler"] = queue_handler
+
+
+atexit.register(stop_logging)
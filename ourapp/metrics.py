@@ -0,0 +1,268 @@
+"""
+Request and database instrumentation.
+
+For every request this records, per endpoint:
+
+    - the latency, in a histogram;
+    - the number of SQL statements run and the time spent running them,
+      counted from SQLAlchemy engine events;
+    - likely N+1 query patterns: one statement run more than
+      METRICS_N_PLUS_ONE_THRESHOLD times in a single request, which is also
+      logged as a warning.
+
+``/metrics`` exposes these, and the application cache hit counts, in the
+Prometheus text format, to requests with the METRICS_TOKEN bearer token, or
+to logged-in administrators when no token is set. Metrics are kept per
+process. In debug mode (or
+with METRICS_RESPONSE_HEADER) each response also carries a Server-Timing
+header with its own timings.
+
+Configuration:
+    METRICS_N_PLUS_ONE_THRESHOLD (int): Repeats of a statement within one
+    request above which it is flagged.
+    METRICS_RESPONSE_HEADER (bool): Add the Server-Timing header outside
+    debug mode too.
+    METRICS_TOKEN (str): Token scrapers send as "Authorization: Bearer
+    <token>" to read ``/metrics``.
+"""
+
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from flask import Response, abort, current_app, g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from ourapp.cache import cart_cache, facet_cache, page_cache, product_cache, user_cache
+from ourapp.logging_config.config import logger
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_N_PLUS_ONE_THRESHOLD = 10
+
+_CACHES = (page_cache, cart_cache, user_cache, facet_cache, product_cache)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, as exposed by Prometheus.
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Record one observation.
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        """
+        Return (upper bound, observations at or below it) pairs, ending with +Inf.
+        """
+        total = 0
+        pairs = []
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class EndpointMetrics:
+    """
+    Metrics collected for one endpoint.
+    """
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.n_plus_one = 0
+
+
+class Registry:
+    """
+    Thread-safe store of the metrics of every endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = defaultdict(EndpointMetrics)
+
+    def record(self, endpoint, seconds, statements, db_seconds, n_plus_one):
+        """
+        Record a finished request.
+        """
+        with self._lock:
+            metrics = self.endpoints[endpoint]
+            metrics.latency.observe(seconds)
+            metrics.statements += statements
+            metrics.db_seconds += db_seconds
+            metrics.n_plus_one += n_plus_one
+
+    def reset(self):
+        """
+        Forget every recorded request.
+        """
+        with self._lock:
+            self.endpoints.clear()
+
+    def render(self):
+        """
+        Render the metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP app_request_duration_seconds Request latency by endpoint.",
+            "# TYPE app_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            for endpoint, metrics in endpoints:
+                for bound, count in metrics.latency.cumulative_counts():
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f'app_request_duration_seconds_bucket{{endpoint="{endpoint}",'
+                        f'le="{le}"}} {count}'
+                    )
+                lines.append(
+                    f'app_request_duration_seconds_sum{{endpoint="{endpoint}"}} '
+                    f"{metrics.latency.sum}"
+                )
+                lines.append(
+                    f'app_request_duration_seconds_count{{endpoint="{endpoint}"}} '
+                    f"{metrics.latency.count}"
+                )
+            for name, help_text, attribute in (
+                ("app_sql_statements_total", "SQL statements run, by endpoint.", "statements"),
+                ("app_sql_duration_seconds_total", "Time spent running SQL, by endpoint.", "db_seconds"),
+                ("app_n_plus_one_total", "Requests with a repeated SQL statement, by endpoint.", "n_plus_one"),
+            ):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for endpoint, metrics in endpoints:
+                    lines.append(
+                        f'{name}{{endpoint="{endpoint}"}} {getattr(metrics, attribute)}'
+                    )
+
+        for name, help_text, attribute in (
+            ("app_cache_hits_total", "Cache hits, by cache.", "hits"),
+            ("app_cache_misses_total", "Cache misses, by cache.", "misses"),
+        ):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for cache in _CACHES:
+                lines.append(f'{name}{{cache="{cache.name}"}} {cache.stats()[attribute]}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    """
+    Statements and database time of the current request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = Counter()
+        self.db_seconds = 0.0
+
+
+def _current():
+    return g.get("request_metrics") if has_request_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, *args):  # pylint: disable=unused-argument
+    if _current() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, *args):  # pylint: disable=unused-argument
+    metrics = _current()
+    started = conn.info.get("query_started")
+    if metrics is not None and started:
+        metrics.db_seconds += time.perf_counter() - started.pop()
+        metrics.statements[statement] += 1
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    started = context.connection.info.get("query_started") if context.connection else None
+    if started:
+        started.pop()
+
+
+def _start_request():
+    g.request_metrics = RequestMetrics()
+
+
+def _finish_request(response):
+    metrics = g.pop("request_metrics", None)
+    if metrics is None:
+        return response
+    seconds = time.perf_counter() - metrics.started
+    endpoint = request.endpoint or "unmatched"
+    statements = sum(metrics.statements.values())
+
+    app = current_app
+    threshold = app.config.get(
+        "METRICS_N_PLUS_ONE_THRESHOLD", DEFAULT_N_PLUS_ONE_THRESHOLD
+    )
+    repeated = [
+        (statement, count)
+        for statement, count in metrics.statements.items()
+        if count > threshold
+    ]
+    for statement, count in repeated:
+        logger.warning(
+            "Possible N+1 query on %s: statement run %s times: %s",
+            endpoint,
+            count,
+            " ".join(statement.split())[:200],
+        )
+    registry.record(endpoint, seconds, statements, metrics.db_seconds, int(bool(repeated)))
+
+    if app.debug or app.config.get("METRICS_RESPONSE_HEADER", False):
+        response.headers["Server-Timing"] = (
+            f"app;dur={seconds * 1000:.1f}, "
+            f'db;dur={metrics.db_seconds * 1000:.1f};desc="{statements} queries"'
+        )
+    return response
+
+
+def metrics_view():
+    """
+    Expose the collected metrics in the Prometheus text format.
+    """
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        authorization = request.headers.get("Authorization", "").encode()
+        if not hmac.compare_digest(authorization, f"Bearer {token}".encode()):
+            abort(401)
+    elif not (current_user.is_authenticated and current_user.is_admin()):
+        abort(403)
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_metrics(app):
+    """
+    Instrument every request of ``app`` and serve ``/metrics``.
+    """
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
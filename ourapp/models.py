@@ -4,7 +4,9 @@ Models defined here
 
 from datetime import datetime
 
+from flask import current_app
 from flask_login import UserMixin
+from sqlalchemy.orm import validates
 
 from ourapp.extensions import db
 
@@ -45,9 +47,10 @@ class Customer(UserMixin, db.Model):
 
     def is_admin(self):
         """
-        returns true if admin
+        returns true if admin, i.e. the email address is listed in the
+        ADMIN_EMAILS setting
         """
-        return False
+        return self.email in current_app.config.get("ADMIN_EMAILS", ())
 
 
 product_category = db.Table(
@@ -56,6 +59,8 @@ product_category = db.Table(
     db.Column(
         "category_id", db.Integer, db.ForeignKey("category.id"), primary_key=True
     ),
+    # The primary key already serves lookups by product_id
+    db.Index("ix_product_category_category_id", "category_id"),
 )
 
 
@@ -83,7 +88,8 @@ class Product(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    price = db.Column(db.Float(100), nullable=False)
+    # Indexed for the price filters and sort orders of the listings
+    price = db.Column(db.Float(100), nullable=False, index=True)
     description = db.Column(db.Text, nullable=False)
     small_description = db.Column(db.String(100), nullable=False)
     image_url = db.Column(db.String(150), nullable=False)
@@ -106,10 +112,17 @@ class Category(db.Model):
     Attributes:
         id (int): The unique identifier for the category.
         name (str): The name of the category.
+        name_normalized (str): The lowercased name, used for lookups.
     """
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
+    name_normalized = db.Column(db.String(100), nullable=False, index=True)
+
+    @validates("name")
+    def _normalize_name(self, key, name):  # pylint: disable=unused-argument
+        self.name_normalized = name.strip().lower()
+        return name
 
     def __repr__(self):
         return f"{self.name}"
@@ -129,10 +142,18 @@ class CartItem(db.Model):
         product (relationship): Relationship with the Product object associated with the cart item.
     """
 
+    __table_args__ = (
+        db.UniqueConstraint(
+            "customer_id", "product_id", name="uq_cart_item_customer_product"
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     quantity = db.Column(db.Integer, default=1)
     customer_id = db.Column(db.Integer, db.ForeignKey("customer.id"), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
+    product_id = db.Column(
+        db.Integer, db.ForeignKey("product.id"), nullable=False, index=True
+    )
     product = db.relationship("Product", backref="cart_items")
 
 
@@ -152,8 +173,18 @@ class Order(db.Model):
         ordered_items (relationship): Relationship with OrderedItem objects
         associated with the order.
         feedback (str): The feedback provided for the order.
+        total_amount (float): The order total, stored when the order is placed.
+        item_count (int): The number of units ordered.
+        item_summary (str): Names of the ordered products, one per line.
     """
 
+    __table_args__ = (
+        # Order history lists a customer's orders of one status, newest first
+        db.Index("ix_order_customer_status_date", "customer_id", "status", "ordered_date"),
+        # Reports and exports select orders by period
+        db.Index("ix_order_ordered_date", "ordered_date"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey("customer.id"), nullable=False)
     # customer = db.relationship('Customer', backref='orders')
@@ -166,10 +197,20 @@ class Order(db.Model):
         "OrderedItem", backref="order", cascade="all, delete-orphan"
     )
     feedback = db.Column(db.Text(300))
+    total_amount = db.Column(db.Float(100), nullable=False, default=0)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    item_summary = db.Column(db.Text, nullable=False, default="")
 
     def __repr__(self):
         return f"{self.id} ordered on {self.ordered_date}"
 
+    @property
+    def item_names(self):
+        """
+        Names of the ordered products.
+        """
+        return self.item_summary.split("\n") if self.item_summary else []
+
 
 #
 # pylint: disable=too-few-public-methods
@@ -187,8 +228,67 @@ class OrderedItem(db.Model):
     """
 
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey("order.id"), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), nullable=False)
+    order_id = db.Column(
+        db.Integer, db.ForeignKey("order.id"), nullable=False, index=True
+    )
+    product_id = db.Column(
+        db.Integer, db.ForeignKey("product.id"), nullable=False, index=True
+    )
     product = db.relationship("Product", backref="ordered_items")
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float(100), nullable=False)
+
+
+# pylint: disable=too-few-public-methods
+class IdSequence(db.Model):
+    """
+    Counter from which blocks of public ids are reserved.
+
+    Attributes:
+        name (str): The kind of id the counter is for, e.g. "customer".
+        next_value (int): The first counter value not yet reserved.
+    """
+
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False, default=0)
+
+
+# pylint: disable=too-few-public-methods
+class ProductActivity(db.Model):
+    """
+    Per-product, per-day popularity counters used to rank trending products.
+
+    Attributes:
+        product_id (int): The foreign key referencing the product.
+        day (date): The day the activity was recorded on.
+        cart_adds (int): Net number of carts the product was added to that day.
+        units_ordered (int): Number of units of the product ordered that day.
+    """
+
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    cart_adds = db.Column(db.Integer, nullable=False, default=0)
+    units_ordered = db.Column(db.Integer, nullable=False, default=0)
+
+
+# pylint: disable=too-few-public-methods
+class ProductNeighbour(db.Model):
+    """
+    Products frequently bought together, for "customers also bought".
+
+    Attributes:
+        product_id (int): The foreign key referencing the product.
+        neighbour_id (int): The foreign key referencing a product bought
+        in the same orders.
+        orders (int): Number of orders containing both products.
+    """
+
+    __table_args__ = (
+        db.Index(
+            "ix_product_neighbour_product_orders", "product_id", "orders", "neighbour_id"
+        ),
+    )
+
+    product_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+    neighbour_id = db.Column(db.Integer, db.ForeignKey("product.id"), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
@@ -5,7 +5,6 @@ This blueprint provides routes for placing orders, viewing orders, changing
 address, providing feedback, cancelling orders, and returning orders.
 """
 
-from random import randint
 from datetime import datetime, timedelta
 from flask import (
     Blueprint,
@@ -19,19 +18,33 @@ from flask import (
 )
 from flask_login import current_user, login_required
 from ourapp.logging_config.config import logger
+from ourapp.cart.summary import forget_cart, load_cart_summary
 from ourapp.extensions import db
-from ourapp.models import CartItem, Product, Order, OrderedItem
+from ourapp.ids import order_ids
+from ourapp.models import CartItem, Order, OrderedItem
+from ourapp import recommendations, trending
 
 order_bp = Blueprint(
     "order_bp", __name__, template_folder="templates", url_prefix="/order"
 )
 
+ORDERS_PER_PAGE = 20
+
 
 def generate_order_id():
     """
-    generates a order id
+    generates a unique, random looking order id
+    """
+    return order_ids.allocate()
+
+
+def orders_query(customer_id, status):
+    """
+    Build the query listing a customer's orders of one status, newest first.
     """
-    return randint(10**6, (10**7) - 1)
+    return Order.query.filter_by(customer_id=customer_id, status=status).order_by(
+        Order.ordered_date.desc(), Order.id.desc()
+    )
 
 
 @order_bp.route("/place")
@@ -44,9 +57,13 @@ def place_order():
         Renders the acknowledgement template with the total order amount and order details.
 
     """
+    # Load the cart lines together with their products in one query. The
+    # cart is read from the database, not the cache: a cached cart may miss
+    # changes made through another worker and charge stale prices
+    cart = load_cart_summary(current_user.id)
     # Ensure the cart is not empty
     # If empty return to products or say no item in the cart
-    if len(current_user.cart) <= 0:
+    if not cart.items:
         flash(message="Cart is empty", category="info")
         return redirect(url_for("public.index"))
     # Check if payment is successful
@@ -59,38 +76,51 @@ def place_order():
 
     customer_id = current_user.id
     arriving_date = datetime.now() + timedelta(days=7)
-    while True:
-        order_id = generate_order_id()
-        if not Order.query.filter_by(id=order_id).first():
-            break
+    order_id = generate_order_id()
+
+    ordered_items = []
+    quantities = {}
+    item_names = []
+    for cartitem in cart.items:
+        ordered_items.append(
+            {
+                "order_id": order_id,
+                "product_id": cartitem.product.id,
+                "quantity": cartitem.quantity,
+                "price": cartitem.product.price,
+            }
+        )
+        quantities[cartitem.product.id] = cartitem.quantity
+        if cartitem.product.name not in item_names:
+            item_names.append(cartitem.product.name)
     new_order = Order(
         id=order_id,
         customer_id=customer_id,
         arriving_date=arriving_date,
         address=current_user.address,
+        total_amount=cart.total,
+        item_count=cart.count,
+        item_summary="\n".join(item_names),
     )
+
+    # The order, its items and the emptied cart are committed together
     db.session.add(new_order)
+    db.session.flush()
+    db.session.execute(db.insert(OrderedItem), ordered_items)
+    # Clearing the ordered lines of the user's cart
+    CartItem.query.filter(
+        CartItem.customer_id == customer_id, CartItem.product_id.in_(quantities)
+    ).delete(synchronize_session=False)
+    trending.record_order(quantities)
+    recommendations.record_order(quantities)
     db.session.commit()
-    print(new_order)
-    for cartitem in current_user.cart:
-        order_id = new_order.id
-        product_id = cartitem.product.id
-        quantity = cartitem.quantity
-        price = cartitem.product.price
-        new_ordereditem = OrderedItem(
-            order_id=order_id, product_id=product_id, quantity=quantity, price=price
-        )
-        db.session.add(new_ordereditem)
-        logger.info(
-            "Order placed successfully for Customer %s(%s) Order ID: %s",
-            current_user.fname,
-            current_user.id,
-            new_order.id,
-        )
-    CartItem.query.filter_by(
-        customer_id=customer_id
-    ).delete()  # Clearing the user's cart
-    db.session.commit()
+    forget_cart(customer_id)
+    logger.info(
+        "Order placed successfully for Customer %s(%s) Order ID: %s",
+        current_user.fname,
+        current_user.id,
+        new_order.id,
+    )
     flash(message=f"{new_order.id}", category="order_placed_success")
 
     return redirect(url_for("order_bp.view_orders", status="confirmed"))
@@ -112,42 +142,28 @@ def view_orders(status):
     allowed_status = set(
         ["confirmed", "cancelled", "delivered", "intransit", "returned"]
     )
-    if status.lower() not in allowed_status:
+    status = status.lower()
+    if status not in allowed_status:
         abort(404)
-    orders = current_user.orders
-    orders_by_status = []
-    for order in orders:
-        if order.status.lower() == status.lower():
-            total = 0
-            items = set()
-            for ordered_item in order.ordered_items:
-                total += ordered_item.price * ordered_item.quantity
-                items.add(ordered_item.product.name)
-            orders_by_status.append([order, list(items), total])
+
+    # Totals and item names are stored on the order when it is placed
+    pagination = orders_query(current_user.id, status).paginate(
+        per_page=ORDERS_PER_PAGE, error_out=False
+    )
+    orders_by_status = [
+        [order, order.item_names, order.total_amount] for order in pagination.items
+    ]
     logger.info(
         "Customer %s(%s) Viewing orders with status: %s",
         current_user.fname,
         current_user.id,
-        status.lower(),
+        status,
     )
-    if status == "cancelled":
-        return render_template(
-            "order/cancelled.html", orders=orders_by_status, status=status.lower()
-        )
-    if status == "delivered":
-        return render_template(
-            "order/delivered.html", orders=orders_by_status, status=status.lower()
-        )
-    if status == "returned":
-        return render_template(
-            "order/returned.html", orders=orders_by_status, status=status.lower()
-        )
-    if status == "intransit":
-        return render_template(
-            "order/intransit.html", orders=orders_by_status, status=status.lower()
-        )
     return render_template(
-        "order/confirmed.html", orders=orders_by_status, status=status.lower()
+        f"order/{status}.html",
+        orders=orders_by_status,
+        status=status,
+        pagination=pagination,
     )
 
 
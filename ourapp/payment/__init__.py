@@ -4,6 +4,7 @@ This module handles the payment
 
 from flask import Blueprint, flash, redirect, render_template, request, session, url_for
 from flask_login import current_user, login_required
+from ourapp.cart.summary import get_cart_summary
 from ourapp.payment.form import PaymentForm
 from ourapp.logging_config.config import logger
 
@@ -32,8 +33,8 @@ def payment():
     Returns:
         str: Rendered HTML template for the payment page.
     """
-    cart = current_user.cart
-    if len(cart) == 0:
+    cart = get_cart_summary()
+    if not cart.items:
         logger.info(
             "Redirecting to view cart because the cart is empty for %s(%s).",
             current_user.fname,
@@ -48,9 +49,6 @@ def payment():
             current_user.id,
         )
         return redirect(url_for("cart.view_cart"))
-    cart_total = 0
-    for cartitem in cart:
-        cart_total += cartitem.product.price * cartitem.quantity
 
     form = PaymentForm(request.form)
 
@@ -59,4 +57,4 @@ def payment():
         logger.info("Payment received. Redirecting to place order.")
         return redirect(url_for("order_bp.place_order"))
     logger.info("Rendering payment page.")
-    return render_template("payment/payment.html", form=form, cart_total=cart_total)
+    return render_template("payment/payment.html", form=form, cart_total=cart.total)
@@ -2,57 +2,182 @@
 This blueprint handles operations related to products.
 
 This blueprint provides routes for viewing all products, 
-viewing products by category,
+viewing products by category, searching products, suggesting
+products as a search is typed,
 and viewing detailed information about a specific product.
 """
 
-from flask import Blueprint, render_template, redirect, url_for
-from ourapp.models import Product, Category
+from flask import Blueprint, jsonify, render_template, redirect, request, url_for
+from ourapp import recommendations
+from ourapp.cache import cached_page
 from ourapp.logging_config.config import logger
+from ourapp.search import search_products
+from ourapp.suggest import suggest
+from .details import get_product_details
+from .queries import (
+    DEFAULT_PAGE_SIZE,
+    SORT_OPTIONS,
+    facet_counts,
+    filtered_products,
+    find_category,
+    parse_filters,
+)
 
 product_bp = Blueprint(
     "product_bp", __name__, url_prefix="/product", template_folder="templates"
 )
 
 
+def _next_page_url(next_page, **view_args):
+    """
+    Build the url of the next page of a listing, keeping its filters.
+    """
+    if next_page is None:
+        return None
+    args = request.args.to_dict(flat=False)
+    args.pop("before", None)
+    args.pop("page", None)
+    args.update(next_page)
+    return url_for(request.endpoint, **view_args, **args)
+
+
 @product_bp.route("/all")
 def view_all_products():
     """
-    View all products.
+    View all products one page at a time, optionally filtered and sorted.
+
+    Query Args:
+        categories (str): Only show products in this category; may be repeated.
+        min_price (float): Only show products costing at least this much.
+        max_price (float): Only show products costing less than this.
+        sort (str): One of "newest", "price_asc", "price_desc", "popularity".
+        before (int): Cursor of the page to show, for the newest-first listing
+        and the products after the trending ones when sorted by popularity.
+        page (int): Page to show, for the price sorts and the trending
+        products when sorted by popularity.
+        per_page (int): Number of products per page.
 
     Returns:
-        Renders the all products template with a list of all products.
+        Renders the all products template with a page of products.
     """
-    products = Product.query.all()
+    filters = parse_filters(request.args)
+    per_page = request.args.get("per_page", DEFAULT_PAGE_SIZE, type=int)
+    products, next_page = filtered_products(
+        filters,
+        page=request.args.get("page", 1, type=int),
+        before=request.args.get("before", type=int),
+        limit=per_page,
+    )
     logger.info("Viewing all products.")
-    return render_template("product/all.html", products=products)
+    return render_template(
+        "product/all.html",
+        products=products,
+        next_url=_next_page_url(next_page),
+        filters=filters,
+        facets=facet_counts(),
+        sort_options=SORT_OPTIONS,
+    )
+
+
+@product_bp.route("/search")
+def search():
+    """
+    Search products by name and description.
+
+    Query Args:
+        q (str): The search text.
+        page (int): The page of results to show, starting at 1.
+
+    Returns:
+        Renders the search template with the best matching products.
+    """
+    query = request.args.get("q", "").strip()
+    page = max(1, request.args.get("page", 1, type=int))
+    # Fetch one extra result to find out whether another page exists
+    products = search_products(
+        query, limit=DEFAULT_PAGE_SIZE + 1, offset=(page - 1) * DEFAULT_PAGE_SIZE
+    )
+    has_next = len(products) > DEFAULT_PAGE_SIZE
+    logger.info("Searching products: %s", query)
+    return render_template(
+        "product/search.html",
+        products=products[:DEFAULT_PAGE_SIZE],
+        query=query,
+        page=page,
+        has_next=has_next,
+    )
+
+
+@product_bp.route("/suggest")
+def suggest_products():
+    """
+    Suggest products and categories for a partially typed search.
+
+    Query Args:
+        q (str): The text typed so far.
+
+    Returns:
+        JSON list of suggestions, each with its kind, name and url.
+    """
+    suggestions = suggest(request.args.get("q", ""))
+    return jsonify(
+        [
+            {
+                "kind": suggestion.kind,
+                "name": suggestion.name,
+                "url": (
+                    url_for("product_bp.view_product_details", product_id=suggestion.id)
+                    if suggestion.kind == "product"
+                    else url_for(
+                        "product_bp.view_products_by_category", category=suggestion.name
+                    )
+                ),
+            }
+            for suggestion in suggestions
+        ]
+    )
 
 
 # View products by categories
 @product_bp.route("/category/<string:category>")
+@cached_page
 def view_products_by_category(category):
     """
-    View products by category.
+    View products by category, optionally filtered and sorted.
 
     Args:
         category (str): The name of the category to view products for.
 
+    Query Args:
+        The filters, sort order and page of ``view_all_products``.
+
     Returns:
         Renders the products by category template with a list of 
         products filtered by the given category.
         If the category does not exist, redirects to view all products.
     """
-    category = Category.query.filter(Category.name.ilike(category)).first()
+    category_name = category
+    category = find_category(category_name)
     if category:
-        products_with_categories = category.products.all()
+        filters = parse_filters(request.args)
+        products, next_page = filtered_products(
+            filters,
+            category=category,
+            page=request.args.get("page", 1, type=int),
+            before=request.args.get("before", type=int),
+        )
         logger.info("Viewing products by category: %s", category)
         return render_template(
             "product/products_by_categories.html",
-            products=products_with_categories,
+            products=products,
             category=category.name,
+            next_url=_next_page_url(next_page, category=category_name),
+            filters=filters,
+            facets=facet_counts(category),
+            sort_options=SORT_OPTIONS,
         )
     logger.warning(
-        "Category not found: %s. Redirecting to view all products.", category
+        "Category not found: %s. Redirecting to view all products.", category_name
     )
     return redirect(url_for("product_bp.view_all_products"))
 
@@ -67,11 +192,16 @@ def view_product_details(product_id):
 
     Returns:
         Renders the product details template with detailed information 
-        about the product.
+        about the product, or the not found page for an unknown ID.
     """
-    product = Product.query.filter_by(id=product_id).first()
-    features = product.features.split("\n")
+    product = get_product_details(product_id)
+    if product is None:
+        logger.warning("Product not found: %s.", product_id)
+        return render_template("error_404.html"), 404
     logger.info("Viewing details of product %s(%s).", product.name, product.id)
     return render_template(
-        "product/product_details.html", product=product, features=features
+        "product/product_details.html",
+        product=product,
+        features=product.features,
+        also_bought=recommendations.also_bought([product.id]),
     )
@@ -0,0 +1,103 @@
+"""
+Product detail read model.
+
+Everything the product detail page shows — the product, its feature list
+split into lines, its categories and a few related products — is read once
+and kept in the product cache, keyed by product id. The cache is cleared
+whenever the catalog changes.
+"""
+
+from collections import namedtuple
+
+from ourapp.cache import product_cache
+from ourapp.category_index import category_product_ids
+from ourapp.extensions import db
+from ourapp.models import Category, Product, product_category
+
+from .queries import products_by_ids
+
+# Number of related products shown on the detail page
+RELATED_PRODUCTS = 4
+
+ProductCard = namedtuple("ProductCard", ["id", "name", "price", "image_url"])
+ProductDetails = namedtuple(
+    "ProductDetails",
+    [
+        "id",
+        "name",
+        "price",
+        "description",
+        "small_description",
+        "image_url",
+        "features",
+        "categories",
+        "related",
+    ],
+)
+
+
+def load_product_details(product_id):
+    """
+    Read the detail page data of a product from the database.
+
+    Args:
+        product_id (int): The ID of the product.
+
+    Returns:
+        ProductDetails: The product details, or None if there is no such product.
+    """
+    product = db.session.get(Product, product_id)
+    if product is None:
+        return None
+    categories = [
+        name
+        for (name,) in db.session.query(Category.name)
+        .join(product_category)
+        .filter(product_category.c.product_id == product_id)
+        .order_by(Category.name)
+    ]
+
+    # Newest products sharing a category, without duplicates
+    related_ids = []
+    for category in categories:
+        for related_id in category_product_ids(category):
+            if related_id != product_id and related_id not in related_ids:
+                related_ids.append(related_id)
+            if len(related_ids) == RELATED_PRODUCTS:
+                break
+        if len(related_ids) == RELATED_PRODUCTS:
+            break
+
+    return ProductDetails(
+        id=product.id,
+        name=product.name,
+        price=product.price,
+        description=product.description,
+        small_description=product.small_description,
+        image_url=product.image_url,
+        features=[line for line in product.features.splitlines() if line.strip()],
+        categories=categories,
+        related=[
+            ProductCard(related.id, related.name, related.price, related.image_url)
+            for related in products_by_ids(related_ids)
+        ],
+    )
+
+
+def get_product_details(product_id):
+    """
+    Get the detail page data of a product, from the product cache if possible.
+
+    Args:
+        product_id (int): The ID of the product.
+
+    Returns:
+        ProductDetails: The product details, or None if there is no such product.
+    """
+    key = str(product_id)
+    details = product_cache.get(key)
+    if details is None:
+        details = load_product_details(product_id)
+        if details is not None:
+            product_cache.set(key, details)
+    return details
@@ -0,0 +1,331 @@
+"""
+Product query helpers shared by the public and product blueprints.
+
+Listings are paginated with keyset (cursor) pagination on the product id,
+so the cost of a page does not grow with the size of the catalog. Listings
+sorted by price are paginated by page number. The popularity order is the
+cached trending ranking (see ``ourapp.trending``): the ranked products are
+paginated by page number, then the rest newest first by the id cursor, so
+no query sorts the catalog by rank.
+
+Listings can be filtered by category and price, and show facet counts
+(products per category and per price range) computed by one aggregate
+query and cached until the catalog changes.
+
+Configuration:
+    PRICE_FACET_BOUNDS (tuple): Upper bounds of the price range facets; the
+    last range has no upper bound.
+"""
+
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import String, case, cast, func, literal, select, union_all
+
+from ourapp.cache import facet_cache
+from ourapp.category_index import category_product_ids
+from ourapp.extensions import db
+from ourapp.models import Category, Product, product_category
+from ourapp.trending import CACHE_SIZE, trending_product_ids
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+DEFAULT_PRICE_FACET_BOUNDS = (500, 1000, 5000, 10000)
+
+SORT_OPTIONS = {
+    "newest": "Newest",
+    "price_asc": "Price: low to high",
+    "price_desc": "Price: high to low",
+    "popularity": "Popularity",
+}
+
+ProductFilters = namedtuple(
+    "ProductFilters", ["categories", "min_price", "max_price", "sort"]
+)
+UNFILTERED = ProductFilters(categories=(), min_price=None, max_price=None, sort="newest")
+PriceRange = namedtuple("PriceRange", ["low", "high", "count"])
+Facets = namedtuple("Facets", ["categories", "prices"])
+
+
+def find_category(name):
+    """
+    Look up a category by name, ignoring case.
+
+    Args:
+        name (str): The name of the category.
+
+    Returns:
+        Category: The category, or None if there is no such category.
+    """
+    return Category.query.filter_by(name_normalized=name.strip().lower()).first()
+
+
+def products_by_ids(product_ids):
+    """
+    Fetch products by id with a single ``IN`` query.
+
+    Args:
+        product_ids (list): The ids of the products to fetch.
+
+    Returns:
+        List: Product objects in the order of ``product_ids``; ids with no
+        product are skipped.
+    """
+    if not product_ids:
+        return []
+    products = {
+        product.id: product
+        for product in Product.query.filter(Product.id.in_(product_ids))
+    }
+    return [products[product_id] for product_id in product_ids if product_id in products]
+
+
+def latest_products_query(before=None):
+    """
+    Build the query listing products newest first, below the ``before`` cursor.
+    """
+    query = Product.query
+    if before is not None:
+        query = query.filter(Product.id < before)
+    return query.order_by(Product.id.desc())
+
+
+def latest_products(limit=DEFAULT_PAGE_SIZE, before=None):
+    """
+    Get a page of the newest products.
+
+    Args:
+        limit (int): The maximum number of products to return.
+        before (int): Cursor returned by a previous call; only products
+        with a smaller id are returned.
+
+    Returns:
+        tuple: A list of Product objects (newest first) and the cursor for
+        the next page, or None if this is the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    # Fetch one extra row to find out whether another page exists
+    products = latest_products_query(before).limit(limit + 1).all()
+    next_cursor = None
+    if len(products) > limit:
+        products = products[:limit]
+        next_cursor = products[-1].id
+    return products, next_cursor
+
+
+def parse_filters(args):
+    """
+    Read the listing filters from request query arguments.
+
+    Args:
+        args (MultiDict): The request query arguments. ``categories`` may be
+        given several times.
+
+    Returns:
+        ProductFilters: The filters, with unknown sort options replaced by
+        "newest".
+    """
+    sort = args.get("sort", "newest")
+    if sort not in SORT_OPTIONS:
+        sort = "newest"
+    return ProductFilters(
+        categories=tuple(name for name in args.getlist("categories") if name),
+        min_price=args.get("min_price", type=float),
+        max_price=args.get("max_price", type=float),
+        sort=sort,
+    )
+
+
+def _in_categories(category_ids):
+    return Product.id.in_(
+        select(product_category.c.product_id).where(
+            product_category.c.category_id.in_(category_ids)
+        )
+    )
+
+
+def filtered_products_query(filters, category=None):
+    """
+    Build the query listing the products matching ``filters``.
+
+    Args:
+        filters (ProductFilters): The filters to apply.
+        category (Category): Restrict the listing to this category.
+
+    Returns:
+        Query: The filtered and sorted products. Popularity listings are
+        sorted newest first; ``filtered_products`` puts the trending
+        products first.
+    """
+    query = Product.query
+    if category is not None:
+        query = query.filter(_in_categories([category.id]))
+    if filters.categories:
+        names = [name.strip().lower() for name in filters.categories]
+        category_ids = select(Category.id).where(Category.name_normalized.in_(names))
+        query = query.filter(_in_categories(category_ids))
+    if filters.min_price is not None:
+        query = query.filter(Product.price >= filters.min_price)
+    if filters.max_price is not None:
+        query = query.filter(Product.price < filters.max_price)
+
+    if filters.sort == "price_asc":
+        return query.order_by(Product.price, Product.id.desc())
+    if filters.sort == "price_desc":
+        return query.order_by(Product.price.desc(), Product.id.desc())
+    return query.order_by(Product.id.desc())
+
+
+def _popular_products(query, page, before, limit):
+    """
+    Get a page of the popularity listing from the newest-first ``query``.
+
+    The trending products matching the filters are read with one ``IN``
+    query and paginated by ``page``; once they run out the other products
+    follow newest first, paginated by the ``before`` cursor.
+    """
+    ranked = trending_product_ids(CACHE_SIZE)
+    products = []
+    if before is None and ranked:
+        # At most CACHE_SIZE rows, put in ranking order here
+        matching = {product.id: product for product in query.filter(Product.id.in_(ranked))}
+        trending = [matching[product_id] for product_id in ranked if product_id in matching]
+        start = (page - 1) * limit
+        products = trending[start:start + limit + 1]
+    if len(products) <= limit:
+        rest = query
+        if ranked:
+            rest = rest.filter(Product.id.notin_(ranked))
+        if before is not None:
+            rest = rest.filter(Product.id < before)
+        products += rest.limit(limit + 1 - len(products)).all()
+
+    next_page = None
+    if len(products) > limit:
+        products = products[:limit]
+        if products[-1].id in ranked:
+            next_page = {"page": page + 1}
+        else:
+            next_page = {"before": products[-1].id}
+    return products, next_page
+
+
+def filtered_products(filters, category=None, page=1, before=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Get a page of the products matching ``filters``.
+
+    The newest-first listing is paginated with the ``before`` cursor and
+    the price sort orders by ``page`` number. The popularity listing pages
+    through the trending products by ``page`` number, then through the rest
+    with the ``before`` cursor. An unfiltered category listing is read from
+    the category membership index.
+
+    Args:
+        filters (ProductFilters): The filters to apply.
+        category (Category): Restrict the listing to this category.
+        page (int): The page number, for listings sorted by price and the
+        trending products of the popularity listing.
+        before (int): Cursor returned by a previous call, for the newest-first
+        listing and the rest of the popularity listing.
+        limit (int): The maximum number of products to return.
+
+    Returns:
+        tuple: A list of Product objects and the query arguments of the next
+        page, or None if this is the last page.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if category is not None and filters == UNFILTERED:
+        # Fetch one extra id to find out whether another page exists
+        product_ids = category_product_ids(category.name, limit=limit + 1, before=before)
+        next_page = None
+        if len(product_ids) > limit:
+            product_ids = product_ids[:limit]
+            next_page = {"before": product_ids[-1]}
+        return products_by_ids(product_ids), next_page
+
+    page = max(1, page)
+    query = filtered_products_query(filters, category)
+    if filters.sort == "popularity":
+        return _popular_products(query, page, before, limit)
+    if filters.sort == "newest":
+        if before is not None:
+            query = query.filter(Product.id < before)
+    else:
+        query = query.offset((page - 1) * limit)
+    # Fetch one extra row to find out whether another page exists
+    products = query.limit(limit + 1).all()
+    next_page = None
+    if len(products) > limit:
+        products = products[:limit]
+        if filters.sort == "newest":
+            next_page = {"before": products[-1].id}
+        else:
+            next_page = {"page": page + 1}
+    return products, next_page
+
+
+def facet_counts(category=None):
+    """
+    Count the products per category and per price range.
+
+    Both facets are computed by a single UNION ALL aggregate query and
+    cached until the catalog changes. The price range index is cast to a
+    string to share the category name column.
+
+    Args:
+        category (Category): Only count products in this category.
+
+    Returns:
+        Facets: ``(name, count)`` pairs of categories, busiest first, and the
+        PriceRange of each configured range.
+    """
+    key = f"facets:{category.id if category is not None else ''}"
+    facets = facet_cache.get(key)
+    if facets is not None:
+        return facets
+
+    bounds = current_app.config.get("PRICE_FACET_BOUNDS", DEFAULT_PRICE_FACET_BOUNDS)
+    bucket = case(
+        *[(Product.price < bound, index) for index, bound in enumerate(bounds)],
+        else_=len(bounds),
+    )
+    category_counts = select(
+        literal("category").label("facet"),
+        Category.name.label("value"),
+        func.count().label("count"),
+    ).join_from(Category, product_category)
+    price_counts = select(
+        literal("price").label("facet"),
+        cast(bucket, String).label("value"),
+        func.count().label("count"),
+    )
+    if category is not None:
+        in_category = select(product_category.c.product_id).where(
+            product_category.c.category_id == category.id
+        )
+        category_counts = category_counts.where(
+            product_category.c.product_id.in_(in_category)
+        )
+        price_counts = price_counts.where(Product.id.in_(in_category))
+    statement = union_all(
+        category_counts.group_by(Category.id, Category.name),
+        price_counts.group_by(bucket),
+    )
+
+    categories = []
+    bucket_counts = {}
+    for facet, value, count in db.session.execute(statement):
+        if facet == "category":
+            categories.append((value, count))
+        else:
+            bucket_counts[int(value)] = count
+    categories.sort(key=lambda pair: (-pair[1], pair[0]))
+    lows = (None,) + tuple(bounds)
+    highs = tuple(bounds) + (None,)
+    prices = [
+        PriceRange(low, high, bucket_counts.get(index, 0))
+        for index, (low, high) in enumerate(zip(lows, highs))
+    ]
+    facets = Facets(categories, prices)
+    facet_cache.set(key, facets)
+    return facets
@@ -3,55 +3,41 @@ Public view module
 """
 
 from flask import Blueprint, render_template
-from sqlalchemy import func
 
-from ourapp.extensions import db
-from ourapp.models import CartItem, Category, OrderedItem, Product
+from ourapp.cache import cached_page
+from ourapp.category_index import category_product_ids
+from ourapp.product.queries import latest_products, products_by_ids
+from ourapp.trending import trending_products
 
 public = Blueprint("public", __name__, template_folder="templates", url_prefix="/")
 
 
 def get_trending_products():
     """
-    Get a list of trending products based on the number of occurrences in carts.
+    Get a list of trending products based on recent cart and order activity.
 
     Returns:
         List: A list of trending Product objects.
     """
-    # Query to select Product objects and count the occurrences
-    # of each product in the CartItem table
-    product_count_query = (
-        db.session.query(Product, func.count(CartItem.id).label("cart_count"))\
-        .join(CartItem, Product.id == CartItem.product_id)\
-        .group_by(Product.id)\
-        .order_by(func.count(CartItem.id).desc())
-    )
-
-    # Execute the query
-    product_count_results = product_count_query.all()
-    product_count_results = [i[0] for i in product_count_results]
-    if len(product_count_results) != 0:
-        return product_count_results[:3]
-    return []
+    return trending_products(limit=3)
 
 
-def products_by_category(category):
+def products_by_category(category, limit=None):
     """
     Get products in a specific category.
 
     Args:
         category (str): The name of the category.
+        limit (int): The maximum number of products to return.
 
     Returns:
         List: A list of Product objects in the specified category.
     """
-    category = Category.query.filter(Category.name.ilike(category)).first()
-    if category:
-        return category.products.all()
-    return []
+    return products_by_ids(category_product_ids(category, limit=limit))
 
 
 @public.route("/")
+@cached_page
 def index():
     """
     Render the homepage.
@@ -59,17 +45,30 @@ def index():
     Returns:
         str: Rendered HTML template for the homepage.
     """
-    latest_products = Product.query.order_by(Product.id.desc()).all()
+    # The carousel only ever shows the six newest products
+    newest_products, _ = latest_products(limit=6)
     trending_products = get_trending_products()
 
-    electronics_products = products_by_category("electronics")
-    stationary_products = products_by_category("stationary")
-    homedecor_products = products_by_category("homedecor")
+    # Fetch the products of every category section with one query
+    sections = {
+        category: category_product_ids(category, limit=3)
+        for category in ("electronics", "stationary", "homedecor")
+    }
+    products = {
+        product.id: product
+        for product in products_by_ids(
+            [product_id for product_ids in sections.values() for product_id in product_ids]
+        )
+    }
+    electronics_products, stationary_products, homedecor_products = (
+        [products[product_id] for product_id in product_ids if product_id in products]
+        for product_ids in sections.values()
+    )
 
     return render_template(
         "public/home.html",
         trending_products=trending_products,
-        latest_products=latest_products,
+        latest_products=newest_products,
         electronics_products=electronics_products,
         stationary_products=stationary_products,
         homedecor_products=homedecor_products,
@@ -0,0 +1,115 @@
+"""
+Query plans of the queries issued by the blueprints.
+
+Each entry builds the statement a route runs, with sample parameters, and
+asks the database how it would execute it. Used by ``flask query-plans`` to
+check that every hot lookup is served by an index.
+"""
+
+from ourapp.cart.summary import cart_summary_query
+from ourapp.extensions import db
+from ourapp.models import CartItem, Category, Product, product_category
+from ourapp.order import orders_query
+from ourapp.product.queries import latest_products_query
+from ourapp.recommendations import also_bought_query
+from ourapp.trending import ranking_query
+
+SAMPLE_CUSTOMER_ID = 1000000
+SAMPLE_PRODUCT_ID = 1
+
+
+def blueprint_queries():
+    """
+    Get the statements issued by the blueprints.
+
+    Returns:
+        List: (description, statement) pairs.
+    """
+    return [
+        (
+            "public.index: latest products",
+            latest_products_query().limit(7).statement,
+        ),
+        (
+            "product_bp.view_all_products: next page",
+            latest_products_query(before=SAMPLE_PRODUCT_ID).limit(25).statement,
+        ),
+        ("public.index: trending ranking", ranking_query(20).statement),
+        (
+            "product_bp.view_products_by_category: category lookup",
+            Category.query.filter_by(name_normalized="electronics").limit(1).statement,
+        ),
+        (
+            "public/product_bp: category members by id",
+            Product.query.filter(Product.id.in_([SAMPLE_PRODUCT_ID])).statement,
+        ),
+        (
+            "category membership index: rebuild",
+            db.select(Category.name_normalized, product_category.c.product_id)
+            .join_from(Category, product_category)
+            .order_by(product_category.c.product_id.desc()),
+        ),
+        (
+            "product_bp.view_product_details: product by id",
+            Product.query.filter_by(id=SAMPLE_PRODUCT_ID).limit(1).statement,
+        ),
+        (
+            "product_bp.view_product_details: customers also bought",
+            also_bought_query([SAMPLE_PRODUCT_ID], limit=4).statement,
+        ),
+        (
+            "cart/payment/order_bp: cart summary",
+            cart_summary_query(SAMPLE_CUSTOMER_ID).statement,
+        ),
+        (
+            "cart.increment: update cart line",
+            db.update(CartItem.__table__)
+            .where(
+                CartItem.customer_id == SAMPLE_CUSTOMER_ID,
+                CartItem.product_id == SAMPLE_PRODUCT_ID,
+            )
+            .values(quantity=CartItem.quantity + 1),
+        ),
+        (
+            "order_bp.view_orders: orders by status",
+            orders_query(SAMPLE_CUSTOMER_ID, "confirmed").limit(20).statement,
+        ),
+    ]
+
+
+def explain(statement):
+    """
+    Get the database's plan for a statement without running it.
+
+    Returns:
+        List: The lines of the plan.
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect
+    compiled = statement.compile(
+        dialect=dialect, compile_kwargs={"render_postcompile": True}
+    )
+    if dialect.name == "sqlite":
+        sql = "EXPLAIN QUERY PLAN " + str(compiled)
+    else:
+        sql = "EXPLAIN " + str(compiled)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    rows = connection.exec_driver_sql(sql, params).fetchall()
+    if dialect.name == "sqlite":
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [" ".join(str(column) for column in row) for row in rows]
+
+
+def report():
+    """
+    Yield the plan of every blueprint query as text lines.
+    """
+    for description, statement in blueprint_queries():
+        yield description
+        for line in explain(statement):
+            yield f"    {line}"
+    db.session.rollback()
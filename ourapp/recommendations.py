@@ -0,0 +1,168 @@
+"""
+"Customers also bought" recommendations.
+
+Products bought in the same order are neighbours. The ``product_neighbour``
+table keeps, for each product, how many orders contained it together with
+each neighbour:
+
+    - Placing an order adds its product pairs to the table, with one
+      executemany upsert in the same transaction as the order. An order's
+      pairs grow with the square of its lines, so only its first
+      RECOMMENDATION_MAX_ORDER_LINES products (by id) are counted.
+    - ``flask rebuild-recommendations``, run periodically (e.g. hourly from
+      cron), recomputes the table from every OrderedItem and trims each
+      product back to its top RECOMMENDATION_NEIGHBOURS neighbours, so the
+      pairs added at checkout do not grow the table without bound.
+
+Recommendations are read with one lookup on the (product_id, orders,
+neighbour_id) index.
+
+Configuration:
+    RECOMMENDATION_NEIGHBOURS (int): Neighbours kept per product by a rebuild.
+    RECOMMENDATION_MAX_ORDER_LINES (int): Products of an order whose pairs
+    are counted at checkout.
+"""
+
+import heapq
+from collections import Counter, defaultdict
+from itertools import permutations
+
+from flask import current_app
+from sqlalchemy import func
+
+from ourapp.db_utils import upsert_increment
+from ourapp.extensions import db
+from ourapp.models import OrderedItem, Product, ProductNeighbour
+
+DEFAULT_NEIGHBOURS = 20
+DEFAULT_MAX_ORDER_LINES = 10
+
+# Rows read per round trip while streaming ordered items
+_BATCH_SIZE = 10000
+
+
+def record_order(product_ids):
+    """
+    Count the product pairs of a placed order. The caller commits.
+
+    Args:
+        product_ids (iterable): The ids of the products in the order.
+    """
+    max_lines = current_app.config.get(
+        "RECOMMENDATION_MAX_ORDER_LINES", DEFAULT_MAX_ORDER_LINES
+    )
+    product_ids = sorted(set(product_ids))[:max_lines]
+    upsert_increment(
+        ProductNeighbour,
+        [
+            {"product_id": product_id, "neighbour_id": neighbour_id, "orders": 1}
+            for product_id, neighbour_id in permutations(product_ids, 2)
+        ],
+        ["product_id", "neighbour_id"],
+        ["orders"],
+    )
+
+
+def cooccurrence_counts():
+    """
+    Count how many orders contain each pair of products.
+
+    Ordered items are streamed in order id order, so only one order's
+    products are held at a time besides the sparse counts.
+
+    Returns:
+        dict: Product id to a Counter of neighbour id to number of orders.
+    """
+    counts = defaultdict(Counter)
+    rows = (
+        db.session.query(OrderedItem.order_id, OrderedItem.product_id)
+        .order_by(OrderedItem.order_id)
+        .yield_per(_BATCH_SIZE)
+    )
+    current_order, products = None, set()
+    for order_id, product_id in rows:
+        if order_id != current_order:
+            for pair in permutations(products, 2):
+                counts[pair[0]][pair[1]] += 1
+            current_order, products = order_id, set()
+        products.add(product_id)
+    for pair in permutations(products, 2):
+        counts[pair[0]][pair[1]] += 1
+    return counts
+
+
+def rebuild(neighbours=None):
+    """
+    Recompute the neighbour table from every ordered item.
+
+    Args:
+        neighbours (int): Neighbours kept per product; defaults to the
+        RECOMMENDATION_NEIGHBOURS setting.
+
+    Returns:
+        int: The number of neighbour rows written.
+    """
+    if neighbours is None:
+        neighbours = current_app.config.get(
+            "RECOMMENDATION_NEIGHBOURS", DEFAULT_NEIGHBOURS
+        )
+    rows = []
+    for product_id, counter in cooccurrence_counts().items():
+        top = heapq.nlargest(
+            neighbours, counter.items(), key=lambda item: (item[1], item[0])
+        )
+        rows.extend(
+            {"product_id": product_id, "neighbour_id": neighbour_id, "orders": orders}
+            for neighbour_id, orders in top
+        )
+    ProductNeighbour.query.delete()
+    if rows:
+        db.session.execute(db.insert(ProductNeighbour), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def also_bought_query(product_ids, limit=4):
+    """
+    Build the query for the products most often bought with ``product_ids``.
+    """
+    product_ids = list(set(product_ids))
+    if len(product_ids) == 1:
+        # A single product is one range scan of the (product_id, orders) index
+        query = (
+            db.session.query(Product)
+            .join(ProductNeighbour, ProductNeighbour.neighbour_id == Product.id)
+            .filter(ProductNeighbour.product_id == product_ids[0])
+        )
+        order_by = (ProductNeighbour.orders.desc(), ProductNeighbour.neighbour_id.desc())
+    else:
+        query = (
+            db.session.query(Product)
+            .join(ProductNeighbour, ProductNeighbour.neighbour_id == Product.id)
+            .filter(
+                ProductNeighbour.product_id.in_(product_ids),
+                ProductNeighbour.neighbour_id.not_in(product_ids),
+            )
+            .group_by(Product.id)
+        )
+        order_by = (func.sum(ProductNeighbour.orders).desc(), Product.id.desc())
+    return query.order_by(*order_by).limit(limit)
+
+
+def also_bought(product_ids, limit=4):
+    """
+    Get the products most often bought together with the given products.
+
+    Args:
+        product_ids (iterable): The ids of the products, e.g. a product page
+        or the lines of a cart.
+        limit (int): The maximum number of products to return.
+
+    Returns:
+        List: Product objects, most often bought together first, excluding
+        the given products.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+    return also_bought_query(product_ids, limit=limit).all()
@@ -0,0 +1,162 @@
+"""
+This blueprint provides order reports for administrators.
+
+Order lines can be downloaded as CSV for a customer and/or a period. The
+CSV is generated while the response is sent, from rows fetched a chunk at a
+time with ``yield_per`` (a server-side cursor where the database supports
+one), so a year of orders is never held in memory. Revenue per day, product
+or category is aggregated by the database.
+"""
+
+import csv
+import io
+from datetime import date
+from functools import wraps
+
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    render_template,
+    request,
+    stream_with_context,
+)
+from flask_login import current_user, login_required
+
+from ourapp.extensions import db
+from ourapp.logging_config.config import logger
+from .queries import REVENUE_GROUPS, order_lines_query, revenue_query
+
+reports_bp = Blueprint(
+    "reports", __name__, url_prefix="/reports", template_folder="templates"
+)
+
+# Rows fetched per round trip, and written per chunk of the response
+EXPORT_CHUNK_SIZE = 1000
+
+
+def admin_required(view):
+    """
+    Only let logged-in administrators use a view.
+    """
+
+    @wraps(view)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if not current_user.is_admin():
+            abort(403)
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def _period():
+    """
+    Read the optional ``start`` and ``end`` dates (YYYY-MM-DD) of a report.
+    """
+    return (
+        request.args.get("start", type=date.fromisoformat),
+        request.args.get("end", type=date.fromisoformat),
+    )
+
+
+def csv_stream(columns, rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Generate CSV text, a chunk of rows at a time.
+
+    Args:
+        columns (list): The header row.
+        rows (iterable): The rows to write.
+        chunk_size (int): Number of rows written per yielded chunk.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _csv_response(filename, result):
+    return Response(
+        stream_with_context(csv_stream(list(result.keys()), result)),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+@reports_bp.route("/")
+@admin_required
+def index():
+    """
+    Show the report forms and the revenue per day for the selected period.
+
+    Query Args:
+        group (str): Aggregate revenue per "day", "product" or "category".
+        start (str): First day of the period, YYYY-MM-DD.
+        end (str): Last day of the period, YYYY-MM-DD.
+
+    Returns:
+        Renders the reports template with the revenue rows.
+    """
+    group = request.args.get("group", "day")
+    if group not in REVENUE_GROUPS:
+        abort(404)
+    start, end = _period()
+    rows = db.session.execute(revenue_query(group, start, end)).all()
+    return render_template(
+        "reports/index.html",
+        rows=rows,
+        group=group,
+        groups=REVENUE_GROUPS,
+        start=start,
+        end=end,
+    )
+
+
+@reports_bp.route("/revenue.csv")
+@admin_required
+def revenue_csv():
+    """
+    Download revenue per day, product or category as CSV.
+
+    Query Args:
+        The group and period of ``index``.
+    """
+    group = request.args.get("group", "day")
+    if group not in REVENUE_GROUPS:
+        abort(404)
+    start, end = _period()
+    result = db.session.execute(revenue_query(group, start, end))
+    return _csv_response(f"revenue-by-{group}.csv", result)
+
+
+@reports_bp.route("/orders.csv")
+@admin_required
+def orders_csv():
+    """
+    Download ordered items as CSV, one row per item, oldest order first.
+
+    Query Args:
+        customer_id (int): Only export this customer's orders.
+        start (str): First day of the period, YYYY-MM-DD.
+        end (str): Last day of the period, YYYY-MM-DD.
+    """
+    customer_id = request.args.get("customer_id", type=int)
+    start, end = _period()
+    logger.info(
+        "Admin %s exporting orders (customer %s, %s to %s).",
+        current_user.id,
+        customer_id,
+        start,
+        end,
+    )
+    statement = order_lines_query(customer_id, start, end).execution_options(
+        yield_per=EXPORT_CHUNK_SIZE
+    )
+    result = db.session.execute(statement)
+    return _csv_response("orders.csv", result)
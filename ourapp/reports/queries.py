@@ -0,0 +1,109 @@
+"""
+Queries behind the admin order reports.
+
+Order lines are selected as plain rows so they can be streamed with
+``yield_per``; revenue is aggregated by the database. Cancelled and returned
+orders do not count towards revenue.
+"""
+
+from datetime import timedelta
+
+from sqlalchemy import func, select
+
+from ourapp.models import Category, Order, OrderedItem, Product, product_category
+
+EXCLUDED_FROM_REVENUE = ("cancelled", "returned")
+REVENUE_GROUPS = ("day", "product", "category")
+
+
+def _in_period(statement, start=None, end=None):
+    """
+    Restrict a statement to orders placed from ``start`` to ``end`` (inclusive dates).
+    """
+    if start is not None:
+        statement = statement.where(Order.ordered_date >= start)
+    if end is not None:
+        statement = statement.where(Order.ordered_date < end + timedelta(days=1))
+    return statement
+
+
+def order_lines_query(customer_id=None, start=None, end=None):
+    """
+    Build the statement selecting one row per ordered item, oldest order first.
+
+    Args:
+        customer_id (int): Only export this customer's orders.
+        start (date): First day of the period.
+        end (date): Last day of the period.
+    """
+    statement = (
+        select(
+            Order.id.label("order_id"),
+            Order.customer_id,
+            Order.ordered_date,
+            Order.status,
+            OrderedItem.product_id,
+            Product.name.label("product_name"),
+            OrderedItem.quantity,
+            OrderedItem.price,
+            (OrderedItem.quantity * OrderedItem.price).label("line_total"),
+        )
+        .join(OrderedItem, OrderedItem.order_id == Order.id)
+        .join(Product, Product.id == OrderedItem.product_id)
+        .order_by(Order.ordered_date, Order.id, OrderedItem.id)
+    )
+    if customer_id is not None:
+        statement = statement.where(Order.customer_id == customer_id)
+    return _in_period(statement, start, end)
+
+
+def revenue_query(group, start=None, end=None):
+    """
+    Build the statement aggregating revenue per day, product or category.
+
+    A product in several categories counts towards each of them.
+
+    Args:
+        group (str): One of REVENUE_GROUPS.
+        start (date): First day of the period.
+        end (date): Last day of the period.
+
+    Returns:
+        Select: Rows of (key, label, orders, units, revenue).
+    """
+    revenue = func.sum(OrderedItem.quantity * OrderedItem.price)
+    measures = (
+        func.count(func.distinct(Order.id)).label("orders"),
+        func.sum(OrderedItem.quantity).label("units"),
+        revenue.label("revenue"),
+    )
+    statement = select().select_from(Order).join(
+        OrderedItem, OrderedItem.order_id == Order.id
+    )
+    if group == "day":
+        day = func.date(Order.ordered_date)
+        statement = statement.add_columns(
+            day.label("key"), day.label("label"), *measures
+        ).group_by(day).order_by(day)
+    elif group == "product":
+        statement = (
+            statement.join(Product, Product.id == OrderedItem.product_id)
+            .add_columns(Product.id.label("key"), Product.name.label("label"), *measures)
+            .group_by(Product.id, Product.name)
+            .order_by(revenue.desc())
+        )
+    elif group == "category":
+        statement = (
+            statement.join(
+                product_category,
+                product_category.c.product_id == OrderedItem.product_id,
+            )
+            .join(Category, Category.id == product_category.c.category_id)
+            .add_columns(Category.id.label("key"), Category.name.label("label"), *measures)
+            .group_by(Category.id, Category.name)
+            .order_by(revenue.desc())
+        )
+    else:
+        raise ValueError(f"Unknown revenue group: {group}")
+    statement = statement.where(Order.status.not_in(EXCLUDED_FROM_REVENUE))
+    return _in_period(statement, start, end)
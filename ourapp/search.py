@@ -0,0 +1,202 @@
+"""
+Full-text product search.
+
+On SQLite the catalog is indexed in an FTS5 table, ``product_search``, whose
+rowid is the product id. The table is part of the schema: a migration
+creates it, and ``db.create_all`` / ``db.drop_all`` create and drop it with
+the model tables. Rows are rewritten in the same flush as the product
+writes that change them, and ``flask rebuild-search-index`` rebuilds the
+whole index. Results are ranked with BM25, weighting matches in the name
+highest, and every search term is matched as a prefix so partially typed
+words still find products.
+
+Databases without FTS5 fall back to a case-insensitive LIKE search.
+"""
+
+import re
+
+from flask import current_app
+from sqlalchemy import DDL, bindparam, event, or_, text
+
+from ourapp.extensions import db
+from ourapp.models import Product
+
+FTS_TABLE = "product_search"
+INDEXED_COLUMNS = ("name", "small_description", "description", "features")
+# BM25 weight of each indexed column, in the order above
+COLUMN_WEIGHTS = (10.0, 4.0, 1.0, 2.0)
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+CREATE_FTS_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    f"USING fts5({', '.join(INDEXED_COLUMNS)})"
+)
+DROP_FTS_TABLE = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+
+
+def fts5_supported(connection):
+    """
+    Whether the database behind ``connection`` is SQLite built with FTS5.
+    """
+    if connection.dialect.name != "sqlite":
+        return False
+    options = connection.exec_driver_sql("PRAGMA compile_options").scalars().all()
+    return "ENABLE_FTS5" in options
+
+
+def _fts5_ddl(ddl, target, bind, **kw):  # pylint: disable=unused-argument
+    return fts5_supported(bind)
+
+
+event.listen(
+    db.metadata, "after_create", DDL(CREATE_FTS_TABLE).execute_if(callable_=_fts5_ddl)
+)
+event.listen(
+    db.metadata, "before_drop", DDL(DROP_FTS_TABLE).execute_if(callable_=_fts5_ddl)
+)
+
+
+def init_search(app):
+    """
+    Enable the FTS5 search if the database has the search index table.
+    """
+    with app.app_context():
+        with db.engine.connect() as connection:
+            available = fts5_supported(connection) and db.inspect(connection).has_table(
+                FTS_TABLE
+            )
+        app.extensions["product_search"] = available
+
+
+def _fts_available():
+    return current_app.extensions.get("product_search", False)
+
+
+def _terms(query):
+    return [term.lower() for term in _TERM.findall(query)]
+
+
+def _reindex(connection, product_ids):
+    """
+    Rewrite the index rows of the given products.
+    """
+    params = {"ids": list(product_ids)}
+    connection.execute(
+        text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        ),
+        params,
+    )
+    connection.execute(
+        text(
+            f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(INDEXED_COLUMNS)}) "
+            f"SELECT id, {', '.join(INDEXED_COLUMNS)} FROM product WHERE id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)),
+        params,
+    )
+
+
+def index_products(product_ids):
+    """
+    Rewrite the index rows of products written with bulk statements, which
+    the flush listener does not see. The caller commits.
+
+    Args:
+        product_ids (iterable): The ids of the written products.
+    """
+    product_ids = list(product_ids)
+    if product_ids and _fts_available():
+        _reindex(db.session.connection(), product_ids)
+
+
+@event.listens_for(db.session, "after_flush")
+def _index_flushed_products(session, flush_context):  # pylint: disable=unused-argument
+    if not _fts_available():
+        return
+    product_ids = {
+        obj.id
+        for obj in session.new | session.dirty | session.deleted
+        if isinstance(obj, Product)
+    }
+    if product_ids:
+        _reindex(session.connection(), product_ids)
+
+
+def rebuild_index():
+    """
+    Rebuild the search index from the product table.
+
+    Returns:
+        int: The number of indexed products.
+    """
+    if not _fts_available():
+        return 0
+    connection = db.session.connection()
+    connection.exec_driver_sql(f"DELETE FROM {FTS_TABLE}")
+    connection.exec_driver_sql(
+        f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(INDEXED_COLUMNS)}) "
+        f"SELECT id, {', '.join(INDEXED_COLUMNS)} FROM product"
+    )
+    connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    count = connection.exec_driver_sql(f"SELECT count(*) FROM {FTS_TABLE}").scalar()
+    db.session.commit()
+    return count
+
+
+def search_product_ids(query, limit=24, offset=0):
+    """
+    Find the products matching a search query.
+
+    Args:
+        query (str): The text typed by the customer.
+        limit (int): The maximum number of product ids to return.
+        offset (int): The number of best matches to skip.
+
+    Returns:
+        List: Matching product ids, best match first.
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+    if _fts_available():
+        match = " ".join(f'"{term}"*' for term in terms)
+        weights = ", ".join(str(weight) for weight in COLUMN_WEIGHTS)
+        rows = db.session.execute(
+            text(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT :limit OFFSET :offset"
+            ),
+            {"match": match, "limit": limit, "offset": offset},
+        )
+        return [product_id for (product_id,) in rows]
+
+    conditions = [
+        or_(Product.name.ilike(f"%{term}%"), Product.small_description.ilike(f"%{term}%"))
+        for term in terms
+    ]
+    rows = (
+        db.session.query(Product.id)
+        .filter(*conditions)
+        .order_by(Product.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+    return [product_id for (product_id,) in rows]
+
+
+def search_products(query, limit=24, offset=0):
+    """
+    Find the products matching a search query.
+
+    Returns:
+        List: Matching Product objects, best match first.
+    """
+    product_ids = search_product_ids(query, limit=limit, offset=offset)
+    if not product_ids:
+        return []
+    products = Product.query.filter(Product.id.in_(product_ids)).all()
+    rank = {product_id: position for position, product_id in enumerate(product_ids)}
+    products.sort(key=lambda product: rank[product.id])
+    return products
@@ -0,0 +1,469 @@
+"""
+Synthetic data for load testing and tuning, used by ``flask seed``.
+
+Generates categories, products and their category memberships, customers,
+carts and orders with skewed popularity: the category of a product, the
+products put in carts and orders, and the customers placing orders are all
+drawn from Zipf distributions, so a few categories, best sellers and
+frequent customers dominate, as in real traffic.
+
+Rows are generated one batch at a time and written with executemany Core
+inserts, one transaction per batch, and millions of rows load in minutes.
+Carts and orders draw from a sample of at most SAMPLE_SIZE existing
+products and customers, and the names and prices of a batch's products are
+read with the batch, so memory use is bounded by the batch and sample sizes,
+not by the size of the tables. Product and category ids are assigned here,
+after the highest existing id; customer and order ids come from the same
+allocators as the rows the application creates.
+
+The catalog caches are told about the new products once, when seeding ends.
+"""
+
+import random
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from sqlalchemy import func, select
+from werkzeug.security import generate_password_hash
+
+from ourapp import recommendations, search, trending
+from ourapp.extensions import db
+from ourapp.ids import customer_ids, order_ids
+from ourapp.models import (
+    CartItem,
+    Category,
+    Customer,
+    Order,
+    OrderedItem,
+    Product,
+    product_category,
+)
+from ourapp.signals import notify_catalog_changed
+
+DEFAULT_BATCH_SIZE = 10000
+DEFAULT_EXPONENT = 1.1
+# Most products and customers carts and orders are drawn from; with a Zipf
+# distribution the ones left out would rarely be drawn anyway
+SAMPLE_SIZE = 100000
+# Ids per IN list when reading product names and prices
+_LOOKUP_CHUNK_SIZE = 1000
+
+# The homepage sections come first so they are the most popular categories
+CATEGORY_NAMES = (
+    "electronics",
+    "stationary",
+    "homedecor",
+    "kitchen",
+    "books",
+    "toys",
+    "sports",
+    "garden",
+    "fashion",
+    "beauty",
+)
+ORDER_STATUSES = ("delivered", "confirmed", "intransit", "cancelled", "returned")
+ORDER_STATUS_WEIGHTS = (70, 12, 10, 5, 3)
+SECOND_CATEGORY_RATE = 0.3
+
+_ADJECTIVES = (
+    "classic", "compact", "deluxe", "eco", "smart", "wireless", "steel",
+    "wooden", "portable", "premium", "vintage", "ceramic", "folding", "mini",
+)
+_NOUNS = (
+    "lamp", "notebook", "speaker", "chair", "pen", "clock", "cable", "vase",
+    "charger", "desk", "frame", "mug", "kettle", "backpack", "headphones",
+)
+
+SeedCounts = namedtuple(
+    "SeedCounts",
+    [
+        "categories",
+        "products",
+        "memberships",
+        "customers",
+        "cart_items",
+        "orders",
+        "ordered_items",
+    ],
+)
+
+
+class ZipfSampler:
+    """
+    Draw items with probability proportional to 1 / rank ** exponent.
+
+    Args:
+        items (list): The items, most popular first.
+        exponent (float): Skew of the distribution; 0 is uniform.
+        rng (random.Random): The random generator to draw from.
+    """
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        self.rng = rng
+        self.cum_weights = list(
+            accumulate(1 / rank**exponent for rank in range(1, len(self.items) + 1))
+        )
+
+    def sample(self, count):
+        """
+        Draw ``count`` items, with replacement.
+        """
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=count)
+
+    def sample_distinct(self, count):
+        """
+        Draw up to ``count`` different items.
+        """
+        return list(dict.fromkeys(self.sample(count)))
+
+
+def _batches(total, batch_size):
+    """
+    Split ``total`` rows into batch sizes.
+    """
+    for start in range(0, total, batch_size):
+        yield min(batch_size, total - start)
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _sample_ids(model, size, rng):
+    """
+    Draw up to ``size`` ids of a table's rows, in random order.
+
+    The ids are streamed and reservoir-sampled, so at most ``size`` of them
+    are held at a time.
+    """
+    sample = []
+    rows = db.session.execute(
+        select(model.id).order_by(model.id).execution_options(yield_per=_LOOKUP_CHUNK_SIZE)
+    ).scalars()
+    for seen, row_id in enumerate(rows):
+        if seen < size:
+            sample.append(row_id)
+        else:
+            slot = rng.randint(0, seen)
+            if slot < size:
+                sample[slot] = row_id
+    rng.shuffle(sample)
+    return sample
+
+
+def _product_details(product_ids):
+    """
+    Read the names and prices of products.
+
+    Returns:
+        dict: Product id to (name, price).
+    """
+    product_ids = list(product_ids)
+    details = {}
+    for start in range(0, len(product_ids), _LOOKUP_CHUNK_SIZE):
+        details.update(
+            (product_id, (name, price))
+            for product_id, name, price in db.session.execute(
+                select(Product.id, Product.name, Product.price).where(
+                    Product.id.in_(product_ids[start:start + _LOOKUP_CHUNK_SIZE])
+                )
+            )
+        )
+    return details
+
+
+def _write(table, rows):
+    """
+    Insert a batch of rows with one executemany statement and commit it.
+    """
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+
+
+def _seed_categories(count):
+    """
+    Create the missing categories among the first ``count`` category names.
+
+    Returns:
+        tuple: The category ids, most popular first, and the number created.
+    """
+    names = [
+        CATEGORY_NAMES[number]
+        if number < len(CATEGORY_NAMES)
+        else f"{CATEGORY_NAMES[number % len(CATEGORY_NAMES)]}-{number // len(CATEGORY_NAMES)}"
+        for number in range(count)
+    ]
+    existing = dict(
+        db.session.execute(
+            select(Category.name_normalized, Category.id).where(
+                Category.name_normalized.in_(names)
+            )
+        ).all()
+    )
+    next_id = _next_id(Category)
+    rows = []
+    for name in names:
+        if name not in existing:
+            existing[name] = next_id
+            rows.append({"id": next_id, "name": name, "name_normalized": name})
+            next_id += 1
+    _write(Category.__table__, rows)
+    return [existing[name] for name in names], len(rows)
+
+
+def _seed_products(count, category_sampler, rng, batch_size):
+    """
+    Create products, each in a Zipf-drawn category and sometimes a second one.
+
+    Returns:
+        tuple: The number of products and of memberships created.
+    """
+    next_id = _next_id(Product)
+    memberships = 0
+    for size in _batches(count, batch_size):
+        product_ids = list(range(next_id, next_id + size))
+        next_id += size
+        rows = []
+        for product_id in product_ids:
+            name = f"{rng.choice(_ADJECTIVES).title()} {rng.choice(_NOUNS)} {product_id}"
+            rows.append(
+                {
+                    "id": product_id,
+                    "name": name,
+                    "price": round(rng.lognormvariate(7, 1), 2),
+                    "description": f"The {name.lower()}. " * 10,
+                    "small_description": f"A {name.lower()}",
+                    "image_url": f"https://example.com/products/{product_id}.png",
+                    "features": "\n".join(rng.sample(_ADJECTIVES, 4)),
+                }
+            )
+        db.session.execute(Product.__table__.insert(), rows)
+        links = [
+            {"product_id": product_id, "category_id": category_id}
+            for product_id in product_ids
+            for category_id in category_sampler.sample_distinct(
+                2 if rng.random() < SECOND_CATEGORY_RATE else 1
+            )
+        ]
+        db.session.execute(product_category.insert(), links)
+        memberships += len(links)
+        search.index_products(product_ids)
+        db.session.commit()
+    return count, memberships
+
+
+def _seed_customers(count, batch_size):
+    """
+    Create customers, all with an address and the password "password".
+
+    Returns:
+        list: The ids of the created customers.
+    """
+    password = generate_password_hash("password")
+    created = []
+    for size in _batches(count, batch_size):
+        # Ids are reserved in their own transactions, before this one writes
+        batch = customer_ids.allocate_many(size)
+        _write(
+            Customer.__table__,
+            [
+                {
+                    "id": customer_id,
+                    "fname": "Customer",
+                    "lname": str(customer_id),
+                    "email": f"customer{customer_id}@example.com",
+                    "password": password,
+                    "verified_email": True,
+                    "address": f"{customer_id} Example Street",
+                }
+                for customer_id in batch
+            ],
+        )
+        created.extend(batch)
+    return created
+
+
+def _seed_carts(customers, product_sampler, max_items, rng, batch_size):
+    """
+    Fill the carts of some customers with Zipf-drawn products.
+
+    Returns:
+        int: The number of cart items created.
+    """
+    created = 0
+    for start in range(0, len(customers), batch_size):
+        rows = [
+            {"customer_id": customer_id, "product_id": product_id, "quantity": rng.randint(1, 3)}
+            for customer_id in customers[start:start + batch_size]
+            for product_id in product_sampler.sample_distinct(rng.randint(1, max_items))
+        ]
+        _write(CartItem.__table__, rows)
+        created += len(rows)
+    return created
+
+
+def _seed_orders(count, customer_sampler, product_sampler, options):
+    """
+    Create orders placed by Zipf-drawn customers for Zipf-drawn products.
+
+    Args:
+        options (dict): "rng", "max_items", "days" and "batch_size".
+
+    Returns:
+        tuple: The number of orders and of ordered items created.
+    """
+    rng = options["rng"]
+    now = datetime.now()
+    ordered_items = 0
+    for size in _batches(count, options["batch_size"]):
+        batch = order_ids.allocate_many(size)
+        drawn = []
+        for order_id, customer_id, status in zip(
+            batch,
+            customer_sampler.sample(size),
+            rng.choices(ORDER_STATUSES, weights=ORDER_STATUS_WEIGHTS, k=size),
+        ):
+            lines = {
+                product_id: rng.randint(1, 3)
+                for product_id in product_sampler.sample_distinct(
+                    rng.randint(1, options["max_items"])
+                )
+            }
+            ordered_date = now - timedelta(seconds=rng.randint(0, options["days"] * 86400))
+            drawn.append((order_id, customer_id, status, lines, ordered_date))
+        products = _product_details(
+            {product_id for order in drawn for product_id in order[3]}
+        )
+        orders, items = [], []
+        for order_id, customer_id, status, lines, ordered_date in drawn:
+            orders.append(
+                {
+                    "id": order_id,
+                    "customer_id": customer_id,
+                    "ordered_date": ordered_date,
+                    "arriving_date": ordered_date + timedelta(days=7),
+                    "status": status,
+                    "date_according_to_status": ordered_date,
+                    "address": f"{customer_id} Example Street",
+                    "total_amount": round(
+                        sum(products[id_][1] * quantity for id_, quantity in lines.items()), 2
+                    ),
+                    "item_count": sum(lines.values()),
+                    "item_summary": "\n".join(products[id_][0] for id_ in lines),
+                }
+            )
+            items.extend(
+                {
+                    "order_id": order_id,
+                    "product_id": product_id,
+                    "quantity": quantity,
+                    "price": products[product_id][1],
+                }
+                for product_id, quantity in lines.items()
+            )
+        db.session.execute(Order.__table__.insert(), orders)
+        _write(OrderedItem.__table__, items)
+        ordered_items += len(items)
+    return count, ordered_items
+
+
+def seed(  # pylint: disable=too-many-arguments,too-many-locals
+    categories=10,
+    products=1000,
+    customers=1000,
+    orders=10000,
+    carts=100,
+    *,
+    max_items=4,
+    days=365,
+    exponent=DEFAULT_EXPONENT,
+    batch_size=DEFAULT_BATCH_SIZE,
+    rebuild=True,
+    random_seed=None,
+):
+    """
+    Generate synthetic data on top of what the database already holds.
+
+    Carts and orders draw from the products and customers in the database,
+    not only the ones created by this call; from a random sample of
+    SAMPLE_SIZE of them in larger databases.
+
+    Args:
+        categories (int): Number of categories to make sure exist.
+        products (int): Number of products to create.
+        customers (int): Number of customers to create.
+        orders (int): Number of orders to create.
+        carts (int): Number of created customers given a non-empty cart.
+        max_items (int): The most products in one cart or order.
+        days (int): How many days back order dates go.
+        exponent (float): Skew of the Zipf distributions; 0 is uniform.
+        batch_size (int): Rows generated and inserted per transaction.
+        rebuild (bool): Whether to rebuild the trending counters and
+        recommendations once the carts and orders are written.
+        random_seed (int): Seed of the random generator, for repeatable data.
+
+    Returns:
+        SeedCounts: The number of rows created in each table.
+
+    Raises:
+        ValueError: Products or orders are requested without any category,
+        customer or product to attach them to.
+    """
+    rng = random.Random(random_seed)
+
+    category_ids, created_categories = _seed_categories(categories)
+    if products and not category_ids:
+        raise ValueError("Products need at least one category")
+    category_sampler = ZipfSampler(category_ids, exponent, rng)
+    created_products, memberships = _seed_products(products, category_sampler, rng, batch_size)
+    created_customers = _seed_customers(customers, batch_size)
+
+    # Popularity is unrelated to the order products were created in
+    popularity = _sample_ids(Product, SAMPLE_SIZE, rng)
+    product_sampler = ZipfSampler(popularity, exponent, rng)
+
+    cart_items = 0
+    if carts and popularity:
+        cart_items = _seed_carts(
+            rng.sample(created_customers, min(carts, len(created_customers))),
+            product_sampler,
+            max_items,
+            rng,
+            batch_size,
+        )
+
+    created_orders = ordered_items = 0
+    if orders:
+        customer_pool = _sample_ids(Customer, SAMPLE_SIZE, rng)
+        if not customer_pool or not popularity:
+            raise ValueError("Orders need at least one customer and one product")
+        created_orders, ordered_items = _seed_orders(
+            orders,
+            ZipfSampler(customer_pool, exponent, rng),
+            product_sampler,
+            {
+                "rng": rng,
+                "max_items": max_items,
+                "days": days,
+                "batch_size": batch_size,
+            },
+        )
+
+    if rebuild and (created_orders or cart_items):
+        trending.rebuild()
+        recommendations.rebuild()
+    if created_categories or created_products:
+        notify_catalog_changed()
+
+    return SeedCounts(
+        categories=created_categories,
+        products=created_products,
+        memberships=memberships,
+        customers=len(created_customers),
+        cart_items=cart_items,
+        orders=created_orders,
+        ordered_items=ordered_items,
+    )
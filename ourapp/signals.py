@@ -0,0 +1,81 @@
+"""
+Application signals.
+
+``catalog_changed`` is sent after a transaction that wrote Product or
+Category rows (or the product/category association) is committed, so that
+caches built from the catalog can refresh. Receivers get the ids of the
+products that were written and whether category membership may have changed:
+
+    catalog_changed.connect(receiver)
+
+    def receiver(sender, product_ids, categories_changed): ...
+
+Bulk statements that bypass the ORM unit of work (``query.delete()``,
+``session.execute(insert(...))``) are not seen here; code issuing them calls
+``notify_catalog_changed`` itself.
+"""
+
+from flask import current_app
+from flask.signals import Namespace
+from sqlalchemy import event, inspect
+
+from ourapp.extensions import db
+from ourapp.models import Category, Product
+
+_signals = Namespace()
+
+catalog_changed = _signals.signal("catalog-changed")
+
+_SESSION_KEY = "catalog_changes"
+
+
+def notify_catalog_changed(product_ids=(), categories_changed=True):
+    """
+    Tell the catalog caches that products or categories were written.
+
+    Args:
+        product_ids (iterable): Ids of the products that were written.
+        categories_changed (bool): Whether category membership may have changed.
+    """
+    catalog_changed.send(
+        current_app._get_current_object(),  # pylint: disable=protected-access
+        product_ids=set(product_ids),
+        categories_changed=categories_changed,
+    )
+
+
+def _pending_changes(session):
+    return session.info.setdefault(
+        _SESSION_KEY, {"product_ids": set(), "categories_changed": False}
+    )
+
+
+@event.listens_for(db.session, "after_flush")
+def _collect_catalog_changes(session, flush_context):  # pylint: disable=unused-argument
+    for obj in session.new | session.deleted:
+        if isinstance(obj, Product):
+            changes = _pending_changes(session)
+            changes["product_ids"].add(obj.id)
+            changes["categories_changed"] = True
+        elif isinstance(obj, Category):
+            _pending_changes(session)["categories_changed"] = True
+    for obj in session.dirty:
+        if isinstance(obj, Product) and session.is_modified(obj):
+            changes = _pending_changes(session)
+            changes["product_ids"].add(obj.id)
+            if inspect(obj).attrs.categories.history.has_changes():
+                changes["categories_changed"] = True
+        elif isinstance(obj, Category) and session.is_modified(obj):
+            _pending_changes(session)["categories_changed"] = True
+
+
+@event.listens_for(db.session, "after_commit")
+def _send_catalog_changes(session):
+    changes = session.info.pop(_SESSION_KEY, None)
+    if changes:
+        notify_catalog_changed(**changes)
+
+
+@event.listens_for(db.session, "after_soft_rollback")
+def _discard_catalog_changes(session, previous_transaction):  # pylint: disable=unused-argument
+    session.info.pop(_SESSION_KEY, None)
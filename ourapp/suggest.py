@@ -0,0 +1,109 @@
+"""
+Search-as-you-type suggestions.
+
+Product and category names are kept in memory in a sorted array of
+lowercased keys, one key for every word a name contains (so "lam" suggests
+"Brass Desk Lamp"). A suggestion is a binary search followed by a short
+scan, and never touches the database.
+
+Each process keeps its own copy, loaded when the application starts. A
+committed catalog change rebuilds it in a background thread, and
+suggestions use the previous index until the new one is swapped in.
+Other processes do not hear about the change; with SUGGEST_INDEX_TTL set,
+they refresh their copy once it is that old.
+
+Configuration:
+    SUGGEST_INDEX_TTL (int): Seconds after which a suggestion starts a
+    background refresh of the index; 0 (the default) only refreshes it
+    after a change made by the same process.
+"""
+
+import re
+from bisect import bisect_left
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from ourapp.cache import MemoryIndex
+from ourapp.models import Category, Product
+from ourapp.signals import catalog_changed
+
+Suggestion = namedtuple("Suggestion", ["kind", "id", "name"])
+
+_WORD_START = re.compile(r"\b\w", re.UNICODE)
+
+
+def build_index(connection):
+    """
+    Build the prefix index from the product and category names.
+
+    Args:
+        connection: A database connection to read the names from.
+
+    Returns:
+        dict: The sorted keys and the suggestion each key belongs to.
+    """
+    suggestions = [
+        Suggestion("category", category_id, name)
+        for category_id, name in connection.execute(select(Category.id, Category.name))
+    ]
+    suggestions += [
+        Suggestion("product", product_id, name)
+        for product_id, name in connection.execute(select(Product.id, Product.name))
+    ]
+    entries = []
+    for suggestion in suggestions:
+        name = suggestion.name.lower()
+        for match in _WORD_START.finditer(name):
+            entries.append((name[match.start():], suggestion))
+    # Categories sort before products with the same key
+    entries.sort(key=lambda entry: (entry[0], entry[1].kind, entry[1].name))
+    return {
+        "keys": [key for key, _ in entries],
+        "suggestions": [suggestion for _, suggestion in entries],
+    }
+
+
+suggest_index = MemoryIndex(build_index)
+
+
+def suggest(prefix, limit=8):
+    """
+    Suggest products and categories whose name has a word starting with ``prefix``.
+
+    Args:
+        prefix (str): The text typed so far.
+        limit (int): The maximum number of suggestions to return.
+
+    Returns:
+        List: Suggestion tuples, in name order.
+    """
+    prefix = prefix.strip().lower()
+    if not prefix:
+        return []
+    index = suggest_index.get()
+    keys = index["keys"]
+    results = []
+    seen = set()
+    position = bisect_left(keys, prefix)
+    while position < len(keys) and len(results) < limit:
+        if not keys[position].startswith(prefix):
+            break
+        suggestion = index["suggestions"][position]
+        if suggestion not in seen:
+            seen.add(suggestion)
+            results.append(suggestion)
+        position += 1
+    return results
+
+
+def _refresh_on_change(sender, **extra):  # pylint: disable=unused-argument
+    suggest_index.refresh()
+
+
+def init_suggest(app):
+    """
+    Load the suggestion index and keep it in step with catalog changes.
+    """
+    suggest_index.init_app(app, ttl=app.config.get("SUGGEST_INDEX_TTL"))
+    catalog_changed.connect(_refresh_on_change)
@@ -0,0 +1,216 @@
+"""
+Trending products ranking.
+
+Cart and order activity is recorded as it happens into per-day
+ProductActivity counters, in the same transaction as the cart or order
+change. The ranking is computed from those counters, optionally with
+exponential time decay, and the top product ids are kept in memory so the
+homepage does not aggregate anything on a request.
+
+Configuration:
+    TRENDING_REFRESH_SECONDS (int): How long a computed ranking is served.
+    TRENDING_HALF_LIFE_DAYS (float): Half-life of activity, 0 disables decay.
+    TRENDING_WINDOW_DAYS (int): Days of activity considered when decaying.
+    TRENDING_ORDER_WEIGHT (float): Weight of an ordered unit relative to
+    adding the product to a cart.
+"""
+
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import case, func
+
+from ourapp.db_utils import upsert_increment
+from ourapp.extensions import db
+from ourapp.models import CartItem, Order, OrderedItem, Product, ProductActivity
+
+# Number of product ids kept in the cached ranking, which also orders the
+# first pages of listings sorted by popularity
+CACHE_SIZE = 100
+
+_lock = threading.Lock()
+_ranking = {"product_ids": [], "expires_at": 0.0}
+
+
+def record_cart_add(product_id):
+    """
+    Record that a product was added to a customer's cart.
+    """
+    _record([{"product_id": product_id, "cart_adds": 1, "units_ordered": 0}])
+
+
+def record_cart_remove(product_id):
+    """
+    Record that a product was removed from a customer's cart.
+
+    Today's cart adds are decremented but never below zero, so a removal of
+    a product added on an earlier day does not leave a negative counter.
+    """
+    db.session.execute(
+        db.update(ProductActivity)
+        .where(
+            ProductActivity.product_id == product_id,
+            ProductActivity.day == date.today(),
+            ProductActivity.cart_adds > 0,
+        )
+        .values(cart_adds=ProductActivity.cart_adds - 1)
+    )
+
+
+def record_order(quantities):
+    """
+    Record the products of a placed order.
+
+    Args:
+        quantities (dict): Mapping of product id to the quantity ordered.
+    """
+    _record(
+        [
+            {"product_id": product_id, "cart_adds": 0, "units_ordered": quantity}
+            for product_id, quantity in quantities.items()
+        ]
+    )
+
+
+def _record(rows):
+    """
+    Add the given deltas to today's counters. The caller commits.
+    """
+    today = date.today()
+    for row in rows:
+        row["day"] = today
+    upsert_increment(
+        ProductActivity, rows, ["product_id", "day"], ["cart_adds", "units_ordered"]
+    )
+
+
+def ranking_query(size):
+    """
+    Build the query ranking products by their (decayed) activity score.
+
+    Returns:
+        Query: Rows of product ids, most trending first.
+    """
+    config = current_app.config
+    order_weight = config.get("TRENDING_ORDER_WEIGHT", 3.0)
+    half_life = config.get("TRENDING_HALF_LIFE_DAYS", 7)
+    window = config.get("TRENDING_WINDOW_DAYS", 30)
+
+    activity = ProductActivity.cart_adds + order_weight * ProductActivity.units_ordered
+    query = db.session.query(ProductActivity.product_id)
+    if half_life:
+        today = date.today()
+        decay = case(
+            *[
+                (
+                    ProductActivity.day == today - timedelta(days=age),
+                    0.5 ** (age / half_life),
+                )
+                for age in range(window)
+            ],
+            else_=0.0,
+        )
+        score = func.sum(activity * decay)
+        query = query.filter(ProductActivity.day > today - timedelta(days=window))
+    else:
+        score = func.sum(activity)
+    return (
+        query.group_by(ProductActivity.product_id)
+        .having(score > 0)
+        .order_by(score.desc(), ProductActivity.product_id.desc())
+        .limit(size)
+    )
+
+
+def trending_product_ids(limit):
+    """
+    Get the ids of the most trending products, from the cached ranking.
+
+    Args:
+        limit (int): The maximum number of product ids to return.
+
+    Returns:
+        List: Product ids, most trending first.
+    """
+    if _ranking["expires_at"] <= time.monotonic():
+        with _lock:
+            if _ranking["expires_at"] <= time.monotonic():
+                refresh = current_app.config.get("TRENDING_REFRESH_SECONDS", 60)
+                _ranking["product_ids"] = [
+                    product_id
+                    for (product_id,) in ranking_query(max(limit, CACHE_SIZE))
+                ]
+                _ranking["expires_at"] = time.monotonic() + refresh
+    return _ranking["product_ids"][:limit]
+
+
+def trending_products(limit):
+    """
+    Get the most trending products.
+
+    Args:
+        limit (int): The maximum number of products to return.
+
+    Returns:
+        List: Product objects, most trending first.
+    """
+    product_ids = trending_product_ids(limit)
+    if not product_ids:
+        return []
+    products = Product.query.filter(Product.id.in_(product_ids)).all()
+    products.sort(key=lambda product: product_ids.index(product.id))
+    return products
+
+
+def invalidate():
+    """
+    Drop the cached ranking so the next request recomputes it.
+    """
+    _ranking["expires_at"] = 0.0
+
+
+def rebuild():
+    """
+    Rebuild the activity counters from the current carts and past orders.
+
+    Returns:
+        int: The number of counter rows written.
+    """
+    today = date.today()
+    counters = {}
+
+    cart_counts = db.session.query(CartItem.product_id, func.count(CartItem.id))\
+        .group_by(CartItem.product_id)
+    for product_id, count in cart_counts:
+        counters.setdefault((product_id, today), [0, 0])[0] += count
+
+    ordered_day = func.date(Order.ordered_date)
+    order_counts = (
+        db.session.query(
+            OrderedItem.product_id, ordered_day, func.sum(OrderedItem.quantity)
+        )
+        .join(Order, Order.id == OrderedItem.order_id)
+        .group_by(OrderedItem.product_id, ordered_day)
+    )
+    for product_id, day, quantity in order_counts:
+        if isinstance(day, str):
+            day = datetime.strptime(day, "%Y-%m-%d").date()
+        counters.setdefault((product_id, day), [0, 0])[1] += quantity
+
+    ProductActivity.query.delete()
+    rows = [
+        {
+            "product_id": product_id,
+            "day": day,
+            "cart_adds": cart_adds,
+            "units_ordered": units_ordered,
+        }
+        for (product_id, day), (cart_adds, units_ordered) in counters.items()
+    ]
+    if rows:
+        db.session.execute(db.insert(ProductActivity), rows)
+    db.session.commit()
+    invalidate()
+    return len(rows)
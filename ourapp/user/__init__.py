@@ -5,6 +5,7 @@ User view module
 from flask import Blueprint, redirect, render_template, url_for, request, flash
 from flask_login import current_user, login_required
 from werkzeug.security import generate_password_hash, check_password_hash
+from ourapp.auth import forget_user
 from ourapp.models import CartItem, Product
 from ourapp.logging_config.config import logger
 from ourapp.extensions import db
@@ -36,6 +37,7 @@ def update_address():
     """
     current_user.address = request.form["newAddress"]
     db.session.commit()
+    forget_user(current_user.id)
     flash(message="Addredd updated successfully", category="success")
     logger.info(
         "Customer %s(%s) Address updated successfully.",
@@ -90,6 +92,7 @@ def update_password():
 
         current_user.password = generate_password_hash(new_password)
         db.session.commit()
+        forget_user(current_user.id)
         flash("Password updated successfully.", "success")
         logger.info(
             "Password for Customer %s(%s) is updated successfully.",
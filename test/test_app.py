@@ -1,16 +1,73 @@
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from unittest import mock
+
+from sqlalchemy import event, text
+from werkzeug.datastructures import MultiDict
 from werkzeug.security import generate_password_hash
 from flask_testing import TestCase
 
+from benchmarks import storefront
 from ourapp import create_app
+from ourapp import bulk, recommendations, trending
+from ourapp.auth import forget_user, load_user
+from ourapp.cache import cart_cache, product_cache, user_cache
+from ourapp.cart.summary import load_cart_summary
+from ourapp.category_index import category_product_ids, membership_index
+from ourapp.database import engine_options, sqlite_pragmas
 from ourapp.extensions import db
-from ourapp.models import CartItem, Category, Customer, Order, OrderedItem, Product
+from ourapp.ids import customer_ids, order_ids
+from ourapp.metrics import registry
+from ourapp.logging_config.config import init_logging, logger, stop_logging
+from ourapp.models import (
+    CartItem,
+    Category,
+    Customer,
+    Order,
+    OrderedItem,
+    Product,
+    ProductActivity,
+    ProductNeighbour,
+    product_category,
+)
+from ourapp.product.queries import (
+    facet_counts,
+    filtered_products,
+    latest_products,
+    parse_filters,
+)
+from ourapp.search import rebuild_index, search_products
+from ourapp.suggest import suggest, suggest_index
+
+
+def _product(**overrides):
+    """
+    Build a Product with placeholder values for the columns a test does not set.
+    """
+    columns = {
+        "name": "Product",
+        "price": 1.0,
+        "description": "desc",
+        "small_description": "small",
+        "image_url": "img",
+        "features": "a",
+    }
+    columns.update(overrides)
+    return Product(**columns)
 
 
 class TestApp(TestCase):
 
-    def create_app(self):        
-        app = create_app()
-        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///test.db"
+    def create_app(self):
+        # An in-memory database has a single connection, so the in-memory
+        # indexes are rebuilt in the committing thread
+        app = create_app(
+            {"SQLALCHEMY_DATABASE_URI": "sqlite://", "INDEX_BACKGROUND_REFRESH": False}
+        )
         return app
 
     def setUp(self):
@@ -110,6 +167,742 @@ class TestApp(TestCase):
 
         self.assertEqual(response.status_code, 302)
 
+    def test_latest_products_keyset_pagination(self):
+        for i in range(5):
+            db.session.add(_product(name=f"Product {i}", price=10.0, features="a\nb"))
+        db.session.commit()
+
+        first_page, cursor = latest_products(limit=3)
+        self.assertEqual(len(first_page), 3)
+        self.assertIsNotNone(cursor)
+        second_page, cursor = latest_products(limit=3, before=cursor)
+        self.assertEqual(len(second_page), 2)
+        self.assertIsNone(cursor)
+        ids = [p.id for p in first_page + second_page]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_trending_ranking(self):
+        products = []
+        for i in range(3):
+            product = _product(name=f"Trending {i}", price=5.0)
+            db.session.add(product)
+            products.append(product)
+        db.session.commit()
+
+        trending.record_cart_add(products[0].id)
+        trending.record_cart_add(products[1].id)
+        trending.record_cart_add(products[1].id)
+        trending.record_order({products[2].id: 1})
+        trending.record_cart_remove(products[0].id)
+        db.session.commit()
+        trending.invalidate()
+
+        ranked = trending.trending_products(limit=3)
+        self.assertEqual(
+            [p.id for p in ranked], [products[2].id, products[1].id]
+        )
+
+    def test_cart_removal_never_makes_counters_negative(self):
+        product = _product(name="Removed", price=5.0)
+        db.session.add(product)
+        db.session.commit()
+        trending.record_cart_remove(product.id)
+        trending.record_cart_add(product.id)
+        trending.record_cart_remove(product.id)
+        trending.record_cart_remove(product.id)
+        db.session.commit()
+        self.assertEqual(
+            [activity.cart_adds for activity in ProductActivity.query], [0]
+        )
+
+    def test_upsert_fallback_for_other_databases(self):
+        product = _product(name="Fallback", price=5.0)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+        self.login(self.test_user)
+        with mock.patch("ourapp.db_utils._dialect_name", return_value="oracle"):
+            self.client.get(f"/cart/add-to-cart/{product_id}")
+            self.client.get(f"/cart/add-to-cart/{product_id}")
+            self.client.get("/cart/add-to-cart/999999")
+            # Without UPDATE ... RETURNING the new quantity is read back
+            self.client.get(f"/cart/increment/{product_id}")
+            self.client.get(f"/cart/increment/{product_id}")
+            self.client.get(f"/cart/decrement/{product_id}")
+            self.client.get("/cart/increment/999999")
+        self.assertEqual(
+            [(item.product_id, item.quantity) for item in CartItem.query],
+            [(product_id, 3)],
+        )
+        self.assertEqual(ProductActivity.query.one().cart_adds, 1)
+
+    def test_homepage_cache_invalidated_by_product_write(self):
+        response = self.client.get("/")
+        self.assertNotIn(b"Fresh Arrival", response.data)
+
+        db.session.add(_product(name="Fresh Arrival"))
+        db.session.commit()
+
+        response = self.client.get("/")
+        self.assertIn(b"Fresh Arrival", response.data)
+
+    def login(self, customer):
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(customer.id)
+            sess["_fresh"] = True
+
+    def test_view_orders_filters_status_and_totals(self):
+        product = _product(name="Ordered Lamp", price=250.0)
+        db.session.add(product)
+        db.session.commit()
+        for order_id, status in [(1000001, "confirmed"), (1000002, "cancelled")]:
+            db.session.add(Order(
+                id=order_id,
+                customer_id=self.test_user.id,
+                status=status,
+                arriving_date=datetime.now(),
+                total_amount=500.0,
+                item_count=2,
+                item_summary="Ordered Lamp",
+            ))
+            db.session.add(OrderedItem(
+                order_id=order_id, product_id=product.id, quantity=2, price=250.0
+            ))
+        db.session.commit()
+        self.login(self.test_user)
+
+        response = self.client.get("/order/confirmed")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"1000001", response.data)
+        self.assertNotIn(b"1000002", response.data)
+        self.assertIn(b"Ordered Lamp", response.data)
+        self.assertIn(b"500.0", response.data)
+
+    def test_place_order_is_written_in_one_transaction(self):
+        products = [
+            _product(name=f"Checkout {i}", price=10.0 * (i + 1))
+            for i in range(2)
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        for quantity, product in enumerate(products, start=1):
+            db.session.add(CartItem(
+                customer_id=self.test_user.id, product_id=product.id, quantity=quantity
+            ))
+        self.test_user.address = "Somewhere"
+        db.session.commit()
+        self.login(self.test_user)
+        with self.client.session_transaction() as sess:
+            sess["payment_received"] = True
+        # A stale cart cached by this or another worker is not what is ordered
+        stale = load_cart_summary(self.test_user.id)
+        cart_cache.set(str(self.test_user.id), stale._replace(items=stale.items[:1], total=1.0))
+
+        response = self.client.get("/order/place")
+        self.assertEqual(response.status_code, 302)
+        order = Order.query.filter_by(customer_id=self.test_user.id).one()
+        self.assertEqual(order.total_amount, 50.0)
+        self.assertEqual(order.item_count, 3)
+        self.assertEqual(order.item_names, ["Checkout 0", "Checkout 1"])
+        self.assertEqual(OrderedItem.query.filter_by(order_id=order.id).count(), 2)
+        self.assertEqual(CartItem.query.filter_by(customer_id=self.test_user.id).count(), 0)
+        # The order's product pair is counted for recommendations
+        self.assertEqual(recommendations.also_bought([products[0].id]), [products[1]])
+
+    def test_cart_mutations(self):
+        product = _product(name="Cart Pen", price=2.0)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+        customer_id = self.test_user.id
+        self.login(self.test_user)
+
+        def quantity():
+            item = CartItem.query.filter_by(
+                customer_id=customer_id, product_id=product_id
+            ).first()
+            return item.quantity if item else 0
+
+        self.client.get(f"/cart/add-to-cart/{product_id}")
+        self.client.get(f"/cart/add-to-cart/{product_id}")
+        self.assertEqual(quantity(), 2)
+        self.client.get(f"/cart/increment/{product_id}")
+        self.assertEqual(quantity(), 3)
+        self.client.get(f"/cart/decrement/{product_id}")
+        self.client.get(f"/cart/decrement/{product_id}")
+        self.assertEqual(quantity(), 1)
+        self.client.get(f"/cart/decrement/{product_id}")
+        self.assertEqual(quantity(), 0)
+        self.client.get(f"/cart/add-to-cart/{product_id}")
+        self.client.get(f"/cart/remove/{product_id}")
+        self.assertEqual(quantity(), 0)
+
+        self.client.get("/cart/add-to-cart/999999")
+        self.assertEqual(CartItem.query.count(), 0)
+
+    def test_cart_summary_total(self):
+        products = [
+            _product(name=f"Summary {i}", price=price)
+            for i, price in enumerate([3.0, 4.5])
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        db.session.add(CartItem(customer_id=self.test_user.id, product_id=products[0].id, quantity=2))
+        db.session.add(CartItem(customer_id=self.test_user.id, product_id=products[1].id, quantity=1))
+        db.session.commit()
+
+        summary = load_cart_summary(self.test_user.id)
+        self.assertEqual(summary.total, 10.5)
+        self.assertEqual(summary.count, 3)
+        self.assertEqual([line.product.name for line in summary.items], ["Summary 0", "Summary 1"])
+
+        self.login(self.test_user)
+        response = self.client.get("/cart/")
+        self.assertIn(b"Summary 1", response.data)
+        self.assertIn(b"10.5", response.data)
+
+        # Cart changes drop the cached cart and the next read reloads it
+        key = str(self.test_user.id)
+        self.assertEqual(cart_cache.get(key).total, 10.5)
+        self.client.get(f"/cart/increment/{products[1].id}")
+        self.assertIsNone(cart_cache.get(key))
+        self.client.get("/cart/")
+        self.assertEqual(cart_cache.get(key).total, 15.0)
+        self.client.get(f"/cart/remove/{products[0].id}")
+        self.assertIsNone(cart_cache.get(key))
+        self.client.get("/cart/")
+        cached = cart_cache.get(key)
+        self.assertEqual((cached.total, cached.count), (9.0, 2))
+
+    def test_cached_user_loader(self):
+        customer_id = self.test_user.id
+        user_cache.clear()
+        hits = user_cache.hits
+
+        load_user(str(customer_id))
+        db.session.remove()
+        customer = load_user(str(customer_id))
+        self.assertEqual(user_cache.hits, hits + 1)
+        self.assertEqual(customer.email, "test@gmail.com")
+        # The password hash is not cached but still readable
+        self.assertNotIn("password", user_cache.get(str(customer_id)))
+        self.assertTrue(customer.password.startswith(("scrypt:", "pbkdf2:")))
+
+        # Changes to a user loaded from the cache are still saved
+        customer.address = "New Street 1"
+        db.session.commit()
+        forget_user(customer_id)
+        db.session.remove()
+        self.assertEqual(db.session.get(Customer, customer_id).address, "New Street 1")
+        self.assertIsNone(user_cache.get(str(customer_id)))
+
+    def test_category_lookup_ignores_case(self):
+        category = Category(name="Electronics")
+        product = _product(name="Category Radio", categories=[category])
+        db.session.add(product)
+        db.session.commit()
+        self.assertEqual(category.name_normalized, "electronics")
+
+        response = self.client.get("/product/category/ELECTRONICS")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Category Radio", response.data)
+
+    def test_search_products(self):
+        rebuild_index()
+        lamp = _product(
+            name="Brass Desk Lamp",
+            price=10.0,
+            description="A lamp for reading",
+            small_description="Warm light",
+            features="Dimmable",
+        )
+        stand = _product(
+            name="Monitor Stand",
+            price=20.0,
+            description="Fits under a desk lamp",
+            small_description="Raises the screen",
+            features="Steel",
+        )
+        db.session.add_all([lamp, stand])
+        db.session.commit()
+
+        # Name matches rank first, and partial words match as prefixes
+        self.assertEqual(
+            [product.name for product in search_products("lam")],
+            ["Brass Desk Lamp", "Monitor Stand"],
+        )
+        self.assertEqual(search_products("steel"), [stand])
+
+        # The index follows product updates and deletes
+        stand.features = "Aluminium"
+        db.session.delete(lamp)
+        db.session.commit()
+        self.assertEqual(search_products("steel"), [])
+        self.assertEqual(search_products("lamp"), [stand])
+
+        response = self.client.get("/product/search?q=monitor")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Monitor Stand", response.data)
+
+        # The index table is part of the schema
+        db.session.remove()
+        db.drop_all()
+        self.assertFalse(db.inspect(db.engine).has_table("product_search"))
+        db.create_all()
+        self.assertTrue(db.inspect(db.engine).has_table("product_search"))
+
+    def test_suggest_from_memory(self):
+        product = _product(
+            name="Brass Desk Lamp",
+            price=10.0,
+            categories=[Category(name="Lamps")],
+        )
+        db.session.add(product)
+        db.session.commit()
+
+        # The commit refreshed the index; suggesting runs no queries
+        statements = []
+
+        def record(conn, cursor, statement, *args):  # pylint: disable=unused-argument
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        names = [suggestion.name for suggestion in suggest("LAM")]
+        event.remove(db.engine, "before_cursor_execute", record)
+        self.assertEqual(statements, [])
+        self.assertEqual(names, ["Brass Desk Lamp", "Lamps"])
+        self.assertEqual(suggest("desk")[0].id, product.id)
+        self.assertEqual(suggest("zzz"), [])
+
+        # With a TTL, a change committed by another worker shows once the
+        # index is that old
+        suggest_index.ttl = 60
+        self.addCleanup(setattr, suggest_index, "ttl", 0)
+        db.session.execute(
+            Product.__table__.insert(),
+            [
+                {
+                    "name": "Zinc Shelf",
+                    "price": 5.0,
+                    "description": "desc",
+                    "small_description": "small",
+                    "image_url": "img",
+                    "features": "a",
+                }
+            ],
+        )
+        db.session.commit()
+        self.assertEqual(suggest("zinc"), [])
+        with mock.patch("ourapp.cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertEqual([s.name for s in suggest("zinc")], ["Zinc Shelf"])
+
+        response = self.client.get("/product/suggest?q=bra")
+        self.assertEqual(
+            response.json,
+            [
+                {
+                    "kind": "product",
+                    "name": "Brass Desk Lamp",
+                    "url": f"/product/{product.id}",
+                }
+            ],
+        )
+
+    def test_filtered_products_and_facets(self):
+        desks = Category(name="Desks")
+        lamps = Category(name="Lamps")
+        for name, price, categories in [
+            ("Cheap Lamp", 100.0, [lamps]),
+            ("Desk Lamp", 800.0, [desks, lamps]),
+            ("Big Desk", 7000.0, [desks]),
+        ]:
+            db.session.add(_product(name=name, price=price, categories=categories))
+        db.session.commit()
+
+        filters = parse_filters(
+            MultiDict([("categories", "lamps"), ("max_price", "1000"), ("sort", "price_desc")])
+        )
+        products, next_page = filtered_products(filters, limit=1)
+        self.assertEqual([product.name for product in products], ["Desk Lamp"])
+        self.assertEqual(next_page, {"page": 2})
+        products, next_page = filtered_products(filters, page=2, limit=1)
+        self.assertEqual([product.name for product in products], ["Cheap Lamp"])
+        self.assertIsNone(next_page)
+
+        products, _ = filtered_products(parse_filters(MultiDict()), category=desks)
+        self.assertEqual([product.name for product in products], ["Big Desk", "Desk Lamp"])
+
+        # Popularity follows the trending ranking, then the newest products
+        cheap_lamp = Product.query.filter_by(name="Cheap Lamp").one()
+        trending.record_cart_add(cheap_lamp.id)
+        db.session.commit()
+        trending.invalidate()
+        products, _ = filtered_products(
+            parse_filters(MultiDict([("sort", "popularity")])), category=lamps
+        )
+        self.assertEqual([product.name for product in products], ["Cheap Lamp", "Desk Lamp"])
+        # Trending products are paged by number, then the rest by cursor
+        db.session.add(_product(name="Floor Lamp", price=50.0, categories=[lamps]))
+        db.session.commit()
+        popular = parse_filters(MultiDict([("sort", "popularity"), ("categories", "lamps")]))
+        pages = []
+        next_page = {}
+        while next_page is not None:
+            products, next_page = filtered_products(popular, limit=1, **next_page)
+            pages.append(([product.name for product in products], next_page))
+        floor_lamp = Product.query.filter_by(name="Floor Lamp").one()
+        self.assertEqual(pages, [
+            (["Cheap Lamp"], {"page": 2}),
+            (["Floor Lamp"], {"before": floor_lamp.id}),
+            (["Desk Lamp"], None),
+        ])
+
+        facets = facet_counts(desks)
+        self.assertEqual(facets.categories, [("Desks", 2), ("Lamps", 1)])
+        self.assertEqual(
+            [price.count for price in facets.prices], [0, 1, 0, 1, 0]
+        )
+
+        # Facets are cached until the catalog changes
+        db.session.add(_product(name="Small Desk", price=300.0, categories=[desks]))
+        db.session.commit()
+        self.assertEqual(facet_counts(desks).categories[0], ("Desks", 3))
+
+        response = self.client.get("/product/category/desks?sort=price_asc")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Small Desk", response.data)
+
+    def test_category_membership_index(self):
+        lamps = Category(name="Lamps")
+        products = [
+            _product(name=f"Lamp {i}", categories=[lamps])
+            for i in range(3)
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        ids = sorted((product.id for product in products), reverse=True)
+
+        self.assertEqual(category_product_ids("LAMPS"), ids)
+        self.assertEqual(category_product_ids("lamps", limit=1, before=ids[0]), [ids[1]])
+        self.assertEqual(category_product_ids("lamps", before=ids[0] + 1), ids)
+        self.assertEqual(category_product_ids("lamps", before=ids[-1]), [])
+        self.assertEqual(category_product_ids("unknown"), [])
+
+        # Changing membership refreshes the index
+        products[0].categories = []
+        db.session.commit()
+        self.assertEqual(category_product_ids("lamps"), ids[:2])
+
+        # With a TTL, a change committed by another worker shows once the
+        # index is that old
+        membership_index.ttl = 60
+        self.addCleanup(setattr, membership_index, "ttl", 0)
+        db.session.execute(
+            product_category.delete().where(product_category.c.product_id == ids[0])
+        )
+        db.session.commit()
+        self.assertEqual(category_product_ids("lamps"), ids[:2])
+        with mock.patch("ourapp.cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertEqual(category_product_ids("lamps"), ids[1:2])
+
+        response = self.client.get("/product/category/lamps")
+        self.assertIn(b"Lamp 1", response.data)
+        self.assertNotIn(b"Lamp 0", response.data)
+
+    def test_product_details_cache(self):
+        lamps = Category(name="Lamps")
+        lamp, other = [
+            _product(name=name, features="Bright\r\n\r\nDimmable", categories=[lamps])
+            for name in ("Desk Lamp", "Floor Lamp")
+        ]
+        db.session.add_all([lamp, other])
+        db.session.commit()
+
+        response = self.client.get(f"/product/{lamp.id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Floor Lamp", response.data)
+        details = product_cache.get(str(lamp.id))
+        self.assertEqual(details.features, ["Bright", "Dimmable"])
+        self.assertEqual(details.categories, ["Lamps"])
+        self.assertEqual([card.id for card in details.related], [other.id])
+
+        # Editing a product drops the cached details
+        lamp.name = "Reading Lamp"
+        db.session.commit()
+        self.assertIsNone(product_cache.get(str(lamp.id)))
+        self.assertIn(b"Reading Lamp", self.client.get(f"/product/{lamp.id}").data)
+
+        self.assertEqual(self.client.get("/product/999999").status_code, 404)
+
+    def test_rebuild_recommendations(self):
+        products = [
+            _product(name=f"Bundle {i}")
+            for i in range(4)
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        a, b, c, d = [product.id for product in products]
+        baskets = [[a, b], [a, b, c], [a, c], [a, b], [c, d]]
+        for order_id, basket in enumerate(baskets, start=1):
+            db.session.add(Order(
+                id=order_id, customer_id=self.test_user.id, address="x",
+                arriving_date=datetime.now(),
+            ))
+            db.session.add_all(
+                OrderedItem(order_id=order_id, product_id=product_id, quantity=1, price=1.0)
+                for product_id in basket
+            )
+        db.session.commit()
+
+        self.assertEqual(recommendations.cooccurrence_counts()[a], {b: 3, c: 2})
+        # Only the top neighbour of each product is kept
+        self.assertEqual(recommendations.rebuild(neighbours=1), 4)
+        self.assertEqual([p.id for p in recommendations.also_bought([a])], [b])
+        self.assertEqual([p.id for p in recommendations.also_bought([c])], [a])
+        self.assertEqual([p.id for p in recommendations.also_bought([a, c])], [b])
+
+        # Checkout adds the pairs of at most RECOMMENDATION_MAX_ORDER_LINES products
+        self.app.config["RECOMMENDATION_MAX_ORDER_LINES"] = 3
+        recommendations.record_order([d, c, b, a])
+        recommendations.record_order([b, c])
+        db.session.commit()
+        self.assertIsNone(db.session.get(ProductNeighbour, (a, d)))
+        self.assertEqual(db.session.get(ProductNeighbour, (b, c)).orders, 2)
+        # Existing pairs are incremented
+        self.assertEqual(db.session.get(ProductNeighbour, (c, a)).orders, 3)
+        # A rebuild trims the table back to the top neighbours
+        self.assertEqual(recommendations.rebuild(neighbours=1), 4)
+
+    def test_import_and_export_products(self):
+        db.session.add(Category(name="Lamps"))
+        db.session.commit()
+        source = io.StringIO(
+            "name,price,description,small_description,image_url,features,categories\n"
+            "Desk Lamp,10,desc,small,img,Bright,lamps|Office\n"
+            "Stapler,2.5,desc,small,img,Steel,Office\n"
+            "Plain Box,1,desc,small,img,Cardboard,\n"
+        )
+        self.assertEqual(bulk.import_products(source, "csv", chunk_size=2), 3)
+        self.assertEqual(Category.query.count(), 2)
+        self.assertEqual(
+            sorted(product.name for product in Category.query.filter_by(name="Office").one().products),
+            ["Desk Lamp", "Stapler"],
+        )
+        self.assertEqual(search_products("stapl")[0].name, "Stapler")
+
+        exported = io.StringIO()
+        self.assertEqual(bulk.export_products(exported, "jsonl", chunk_size=1), 3)
+        rows = [json.loads(line) for line in exported.getvalue().splitlines()]
+        self.assertEqual(
+            [(row["name"], row["categories"]) for row in rows],
+            [("Desk Lamp", ["Lamps", "Office"]), ("Stapler", ["Office"]), ("Plain Box", [])],
+        )
+
+        # An exported file imports again
+        reimported = io.StringIO(exported.getvalue())
+        self.assertEqual(bulk.import_products(reimported, "jsonl"), 3)
+
+        with self.assertRaises(bulk.InvalidRowError):
+            bulk.import_products(io.StringIO('{"name": "No price"}\n'), "jsonl")
+        for bad_record in ('{"name": \n', '["Desk Lamp", 10]\n'):
+            with self.assertRaisesRegex(bulk.InvalidRowError, "Row 1"):
+                bulk.import_products(io.StringIO(bad_record), "jsonl")
+
+        result = self.app.test_cli_runner().invoke(args=["export", "products", "--format", "csv"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(len(result.stdout.splitlines()), 7)
+        result = self.app.test_cli_runner().invoke(args=["export", "orders", "--format", "jsonl"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.stdout, "")
+
+        # The catalog caches are told once per import, not once per chunk
+        with mock.patch("ourapp.bulk.notify_catalog_changed") as notify:
+            imported = bulk.import_products(
+                io.StringIO(exported.getvalue()), "jsonl", chunk_size=1
+            )
+        self.assertEqual(imported, 3)
+        self.assertEqual(notify.call_count, 1)
+        self.assertEqual(len(notify.call_args.args[0]), 3)
+
+    def test_order_reports(self):
+        lamp = _product(name="Report Lamp", price=100.0, categories=[Category(name="Lamps")])
+        db.session.add(lamp)
+        db.session.commit()
+        for order_id, (day, status, quantity) in enumerate(
+            [(1, "confirmed", 2), (1, "delivered", 1), (2, "cancelled", 5), (3, "confirmed", 1)],
+            start=1,
+        ):
+            db.session.add(Order(
+                id=order_id,
+                customer_id=self.test_user.id,
+                address="x",
+                status=status,
+                ordered_date=datetime(2026, 1, day, 12),
+                ordered_items=[OrderedItem(product_id=lamp.id, quantity=quantity, price=100.0)],
+            ))
+        db.session.commit()
+        self.login(self.test_user)
+
+        # Only administrators see the reports
+        self.assertEqual(self.client.get("/reports/").status_code, 403)
+        self.app.config["ADMIN_EMAILS"] = ["test@gmail.com"]
+
+        response = self.client.get("/reports/revenue.csv?group=day&end=2026-01-02")
+        self.assertEqual(
+            response.get_data(as_text=True).splitlines(),
+            ["key,label,orders,units,revenue", "2026-01-01,2026-01-01,2,3,300.0"],
+        )
+        response = self.client.get("/reports/?group=category")
+        self.assertIn(b"Lamps", response.data)
+
+        response = self.client.get("/reports/orders.csv?start=2026-01-02")
+        self.assertTrue(response.is_streamed)
+        lines = response.get_data(as_text=True).splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["order_id", "customer_id"])
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], ["3", "4"])
+
+    def test_queued_json_logging_with_sampling(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log_file = os.path.join(directory, "app.log")
+            self.app.config.update(
+                LOG_FILE=log_file,
+                LOG_FORMAT="json",
+                LOG_TO_STDERR=False,
+                LOG_SAMPLE_RATES={"product_bp.view_all_products": 0.0},
+            )
+            init_logging(self.app)
+            self.client.get("/product/all")
+            logger.warning("Kept warning")
+            stop_logging()
+
+            with open(log_file, encoding="utf-8") as file:
+                entries = [json.loads(line) for line in file]
+        messages = [entry["message"] for entry in entries]
+        self.assertNotIn("Viewing all products.", messages)
+        self.assertIn("Kept warning", messages)
+        self.assertEqual(entries[-1]["level"], "WARNING")
+
+    def test_request_metrics(self):
+        registry.reset()
+        self.app.config.update(METRICS_RESPONSE_HEADER=True, METRICS_N_PLUS_ONE_THRESHOLD=2)
+        self.login(self.test_user)
+        products = [
+            _product(name=f"Metric {i}")
+            for i in range(4)
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+
+        response = self.client.get("/product/all")
+        self.assertIn("db;dur=", response.headers["Server-Timing"])
+        metrics = registry.endpoints["product_bp.view_all_products"]
+        self.assertEqual(metrics.latency.count, 1)
+        self.assertGreater(metrics.statements, 0)
+        self.assertEqual(metrics.n_plus_one, 0)
+
+        # Lazy-loading each product's categories repeats one statement
+        with self.app.test_request_context("/"):
+            self.app.preprocess_request()
+            for product in Product.query.all():
+                db.session.expire(product)
+                _ = product.categories
+            self.app.process_response(self.app.response_class())
+        self.assertEqual(registry.endpoints["public.index"].n_plus_one, 1)
+
+        # Only administrators, or scrapers with the token, read the metrics
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.app.config["METRICS_TOKEN"] = "scrape-token"
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        response = self.client.get(
+            "/metrics", headers={"Authorization": "Bearer scrape-token"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.app.config["METRICS_TOKEN"] = None
+        self.app.config["ADMIN_EMAILS"] = [self.test_user.email]
+        body = self.client.get("/metrics").get_data(as_text=True)
+        self.assertIn(
+            'app_request_duration_seconds_count{endpoint="product_bp.view_all_products"} 1',
+            body,
+        )
+        self.assertIn('app_cache_hits_total{cache="page"}', body)
+
+    def test_seed_skewed_data(self):
+        # Blocks reserved by earlier tests were dropped with their tables
+        customer_ids.reset()
+        order_ids.reset()
+        # Orders draw from a sample of the products; the caches are told once
+        with mock.patch("ourapp.seed.SAMPLE_SIZE", 30), mock.patch(
+            "ourapp.seed.notify_catalog_changed"
+        ) as notify:
+            result = self.app.test_cli_runner().invoke(
+                args=["seed", "--categories", "4", "--products", "50", "--customers", "20",
+                      "--orders", "300", "--carts", "5", "--batch-size", "40", "--seed", "7"]
+            )
+        self.assertEqual(result.exit_code, 0, repr(result.exception))
+        self.assertEqual(notify.call_count, 1)
+        self.assertLessEqual(
+            db.session.query(OrderedItem.product_id).distinct().count(), 30
+        )
+        self.assertIn("orders: 300", result.output)
+        self.assertEqual(Product.query.count(), 50)
+        self.assertEqual(Customer.query.count(), 21)
+        self.assertEqual(Order.query.count(), 300)
+        self.assertEqual(db.session.query(CartItem.customer_id).distinct().count(), 5)
+        for order in Order.query.limit(20):
+            self.assertEqual(order.item_count, sum(item.quantity for item in order.ordered_items))
+
+        # Zipf popularity: the best seller is in far more orders than average
+        per_product = [
+            count
+            for (count,) in db.session.query(db.func.count(OrderedItem.id))
+            .group_by(OrderedItem.product_id)
+        ]
+        self.assertGreater(max(per_product), 5 * sum(per_product) / 50)
+
+    def test_database_engine_configuration(self):
+        pragmas = {
+            name: db.session.execute(text(f"PRAGMA {name}")).scalar()
+            for name in ("journal_mode", "synchronous", "busy_timeout")
+        }
+        # An in-memory database keeps its journal in memory; files use WAL
+        self.assertEqual(
+            pragmas, {"journal_mode": "memory", "synchronous": 1, "busy_timeout": 5000}
+        )
+        self.assertIn("PRAGMA journal_mode = WAL", sqlite_pragmas({}))
+        self.assertNotIn("PRAGMA journal_mode = WAL", sqlite_pragmas({}, in_memory=True))
+
+        options = engine_options(
+            {"SQLALCHEMY_DATABASE_URI": "postgresql://shop@db/shop", "DB_POOL_SIZE": 4}
+        )
+        self.assertEqual(options["pool_size"], 4)
+        self.assertTrue(options["pool_pre_ping"])
+        self.assertEqual(engine_options({"SQLALCHEMY_DATABASE_URI": "sqlite:///shop.db"}), {})
+        with self.assertRaises(ValueError):
+            sqlite_pragmas({"SQLITE_SYNCHRONOUS": "sometimes"})
+
+    def test_benchmark_regressions(self):
+        self.assertEqual(storefront.percentile([5, 1, 4, 2, 3], 0.5), 3)
+        self.assertEqual(storefront.percentile([5, 1, 4, 2, 3], 0.99), 5)
+
+        baseline = {"steps": {"cart": {"p95_ms": 10.0, "queries": 2.0}}}
+        summary = {"steps": {"cart": {"p95_ms": 12.0, "queries": 2.2}}}
+        self.assertEqual(storefront.regressions(summary, baseline, tolerance=0.5), [])
+
+        summary = {"steps": {"cart": {"p95_ms": 16.0, "queries": 3.0}}}
+        problems = storefront.regressions(summary, baseline, tolerance=0.5)
+        self.assertEqual(len(problems), 2)
+        self.assertEqual(
+            storefront.regressions({"steps": {}}, baseline, tolerance=0.5),
+            ["cart: step missing from the run"],
+        )
+
+        # Baseline latencies are scaled to this machine's calibration time
+        baseline = {**baseline, "calibration_ms": 10.0}
+        summary["calibration_ms"] = 20.0
+        problems = storefront.regressions(summary, baseline, tolerance=0.5)
+        self.assertEqual(problems, ["cart: 3.0 queries per request, baseline 2.0"])
+        self.assertGreater(storefront.calibrate(rounds=1), 0)
+
 
 if __name__ == "__main__":
     pass
@@ -0,0 +1,90 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from ourapp import create_app
+from ourapp.cache import LRUCache, MemoryIndex
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=None)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_entries_expire(self):
+        cache = LRUCache(maxsize=2, ttl=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+
+    def test_clear(self):
+        cache = LRUCache()
+        cache.set("a", 1)
+        cache.clear()
+        self.assertIsNone(cache.get("a"))
+
+
+class TestMemoryIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://"})
+        self.builds = 0
+        self.building = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def build(self, connection):  # pylint: disable=unused-argument
+        self.building.set()
+        self.release.wait()
+        self.builds += 1
+        return self.builds
+
+    def test_built_at_startup(self):
+        index = MemoryIndex(self.build)
+        index.init_app(self.app)
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(index.get(), 1)
+        self.assertEqual(self.builds, 1)
+
+    def test_refresh_serves_the_previous_index_until_swapped(self):
+        index = MemoryIndex(self.build)
+        index.init_app(self.app)
+        self.release.clear()
+        self.building.clear()
+        index.refresh()
+        self.building.wait()
+        index.refresh()
+        self.assertEqual(index.get(), 1)
+        self.release.set()
+        index.join()
+        # The refresh requested during the rebuild ran once more
+        self.assertEqual(index.get(), 3)
+
+    def test_refresh_without_background(self):
+        self.app.config["INDEX_BACKGROUND_REFRESH"] = False
+        index = MemoryIndex(self.build, ttl=60)
+        index.init_app(self.app)
+        index.refresh()
+        self.assertEqual(index.get(), 2)
+        with mock.patch("ourapp.cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertEqual(index.get(), 3)
+
+    def test_ttl_starts_a_background_refresh(self):
+        index = MemoryIndex(self.build, ttl=60)
+        index.init_app(self.app)
+        with mock.patch("ourapp.cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertEqual(index.get(), 1)
+            index.join()
+        self.assertEqual(index.get(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from flask_testing import TestCase
+
+from ourapp import create_app
+from ourapp.extensions import db
+from ourapp.ids import ID_MIN, ID_SPACE, IdAllocator, permute
+from ourapp.models import Customer
+
+
+class TestPermutation(unittest.TestCase):
+
+    def test_permutation_is_unique_and_in_range(self):
+        ids = [permute(counter, b"key") for counter in range(20000)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertTrue(all(ID_MIN <= id_ < ID_MIN + ID_SPACE for id_ in ids))
+
+    def test_permutation_depends_on_key(self):
+        self.assertNotEqual(
+            [permute(counter, b"one") for counter in range(10)],
+            [permute(counter, b"two") for counter in range(10)],
+        )
+
+
+class TestIdAllocator(TestCase):
+
+    def create_app(self):
+        app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://", "ID_BLOCK_SIZE": 10})
+        return app
+
+    def setUp(self):
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def test_allocated_ids_are_unique_across_blocks(self):
+        allocator = IdAllocator("test", Customer)
+        ids = [allocator.allocate() for _ in range(35)]
+        ids += allocator.allocate_many(25)
+        self.assertEqual(len(set(ids)), 60)
+
+    def test_existing_ids_are_skipped(self):
+        allocator = IdAllocator("test-existing", Customer)
+        first = allocator.allocate()
+        allocator.reset()
+        db.session.execute(db.delete(db.metadata.tables["id_sequence"]))
+        db.session.add(Customer(
+            id=first, fname="A", lname="B", email="taken@example.com", password="x"
+        ))
+        db.session.commit()
+        self.assertNotEqual(allocator.allocate(), first)
+
+
+if __name__ == "__main__":
+    unittest.main()